@@ -1,14 +1,24 @@
 # Mark Toni Ramsol Tagalogon
 
-import pygame
+import functools
+import logging
 import sys
-import random
-import numpy as np
-import time
 
-# Define constants
-GRID_SIZE = 4
+from background_solver import BackgroundSolve
+from corpus_format import SUFFIX, CorpusError, is_corpus, load_puzzle, save_puzzle
+from grid import resolve_box
+from instrumentation import Instrumentation, LoggingObserver
+from min_conflicts import cell_conflicts
+from puzzle import Puzzle
+from solver import (
+    GRID_SIZE, ENGINES, a_temperature, a_cooling_rate, a_iterations, a_engine,
+    constraints_from_groups,
+)
+
+# Define constants (board geometry is set by configure())
+BOX_ROWS, BOX_COLS = resolve_box(GRID_SIZE)
 CELL_SIZE = 100
+FONT_SIZE = 36
 WINDOW_WIDTH = GRID_SIZE * CELL_SIZE
 WINDOW_HEIGHT = GRID_SIZE * CELL_SIZE
 WHITE = (255, 255, 255, 0) 
@@ -16,206 +26,102 @@ BLACK = (0, 0, 0)
 GRAY = (200, 200, 200)
 RED = (255, 0, 0)
 GREEN = (0, 255, 0)
+# Frame rate cap for the main loop, including live solver progress
+FPS = 30
+# Where "S" saves and "L" loads the puzzle, unless a file is given on the command line
+PUZZLE_FILE = "puzzle" + SUFFIX
+
+logger = logging.getLogger("killer_sudoku")
+
+# pygame and the renderer are imported lazily by init_display() so the solver can be used headless
+pygame = None
+window = None
+renderer = None
+
+
+def configure(size=GRID_SIZE, box=None):
+    # Sets the board size and box shape, shrinking cells so big grids still fit on screen.
+    global GRID_SIZE, BOX_ROWS, BOX_COLS, CELL_SIZE, FONT_SIZE, WINDOW_WIDTH, WINDOW_HEIGHT
+    GRID_SIZE = size
+    BOX_ROWS, BOX_COLS = resolve_box(size, box)
+    CELL_SIZE = max(40, min(100, 600 // size))
+    FONT_SIZE = max(18, CELL_SIZE * 36 // 100)
+    WINDOW_WIDTH = GRID_SIZE * CELL_SIZE
+    WINDOW_HEIGHT = GRID_SIZE * CELL_SIZE
+
+
+def init_display():
+    # Initializes pygame and creates the window on first use.
+    global pygame, window, renderer
+    if window is None:
+        import pygame as _pygame
+        pygame = _pygame
+        pygame.init()
+        window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("Killer Sudoku Maker")
+
+        from renderer import GridRenderer
+        renderer = GridRenderer(window, GRID_SIZE, (BOX_ROWS, BOX_COLS), CELL_SIZE, FONT_SIZE)
+    return window
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(name, size, system=False):
+    # Fonts are loaded once instead of on every frame.
+    if system:
+        return pygame.font.SysFont(name, size)
+    return pygame.font.Font(name, size)
+
+
+def start_solver(new_constraints, engine=a_engine):
+    # Starts solving on a background thread and returns (job, instrument);
+    # the main loop polls the job and renders its progress.
+    # Step events go to the debug log.
+    instrument = Instrumentation([LoggingObserver(logger, logging.DEBUG)])
+    job = BackgroundSolve(new_constraints, temperature=a_temperature, cooling_rate=a_cooling_rate,
+                          iterations=a_iterations, engine=engine, size=GRID_SIZE,
+                          box=(BOX_ROWS, BOX_COLS), instrument=instrument)
+    return job.start(), instrument
+
+
+def finish_solver(job):
+    # Returns (solution, solved) from a finished background solve.
+    result = job.result
+    if result is None:
+        return [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)], False
+    if result.solved:
+        logger.info("Correct solution found.")
+    logger.info("Solver stats: %s", result.stats)
+    return result.solution, result.solved
 
-# Annealing config
-a_temperature = 1.5
-a_cooling_rate = 0.95
-a_iterations = 100
-
-# Initialize Pygame
-pygame.init()
-window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Killer Sudoku Maker")
-
-# Backend
-def generate_board():
-    # Generates a random initial board for the Sudoku puzzle.
-    board = [[0 for _ in range(4)] for _ in range(4)]
-    quadrant_values = [random.sample(range(1, 5), 4) for _ in range(4)]
-    quadrants = [(0, 0), (0, 1), (1, 0), (1, 1)]
-    random.shuffle(quadrants)
-    
-    for idx, (qi, qj) in enumerate(quadrants):
-        values = quadrant_values[idx]
-        for i in range(2):
-            for j in range(2):
-                board[qi * 2 + i][qj * 2 + j] = values[i * 2 + j]
-    
-    return board
-
+# Frontend
+def compile_groups(all_selected_groups):
+    # Compiles the groups entered so far; rebuilt whenever a group or sum is added.
+    return Puzzle.from_groups(all_selected_groups, GRID_SIZE, (BOX_ROWS, BOX_COLS))
 
-def is_valid(board, row, col, num, constraints):
-    # Checks if placing 'num' at (row, col) violates Sudoku and Killer Sudoku rules.
 
-    for c in range(4):
-        if board[row][c] == num and c != col:
-            return False
-    for r in range(4):
-        if board[r][col] == num and r != row:
-            return False
-        
-    start_row = (row // 2) * 2
-    start_col = (col // 2) * 2
-    for i in range(start_row, start_row + 2):
-        for j in range(start_col, start_col + 2):
-            if board[i][j] == num and (i, j) != (row, col):
-                return False
-            
-    region_sum = 0
-    for cells, target_sum in constraints:
-        if (row, col) in cells:
-            for r, c in cells:
-                if board[r][c] == num:
-                    return False  
-                region_sum += board[r][c]
-            if region_sum + num > target_sum:
-                return False 
-            break  
-    return True
-
-def fitness(board, constraints):
-    # Calculates the fitness score of the current board.
-    score = 0
-    for i in range(4):
-        row_values = set()
-        col_values = set()
-        for j in range(4):
-            row_value = board[i][j]
-            col_value = board[j][i]
-            if row_value not in range(1, 5) or col_value not in range(1, 5):
-                score += 1  
-            if row_value in row_values or col_value in col_values:
-                score += 1  
-            row_values.add(row_value)
-            col_values.add(col_value)
-    for cells, target_sum in constraints:
-        cell_sum = sum(board[row][col] for row, col in cells)
-        if cell_sum != target_sum:
-            score += 1  
-    return score
-
-
-import random
-
-def select_neighbor(board):
-    # Selects a neighboring solution by swapping two random cells in the same quadrant.
-    quadrant_i, quadrant_j = random.randint(0, 1), random.randint(0, 1)
-    
-    i1, j1 = random.randint(0, 1), random.randint(0, 1)
-    i2, j2 = random.randint(0, 1), random.randint(0, 1)
-    
-    i1 += quadrant_i * 2
-    j1 += quadrant_j * 2
-    i2 += quadrant_i * 2
-    j2 += quadrant_j * 2
-    
-    board[i1][j1], board[i2][j2] = board[i2][j2], board[i1][j1]
-    
-    return board, (i1, j1), (i2, j2)
+def save_groups(path, all_selected_groups):
+    # Saves the groups entered so far in the binary corpus format; groups
+    # without a sum yet are stored with sum 0.
+    constraints = [([cell for cell in group if isinstance(cell, tuple)],
+                    group[-1] if group and not isinstance(group[-1], tuple) else 0)
+                   for group in all_selected_groups]
+    save_puzzle(path, constraints, GRID_SIZE, (BOX_ROWS, BOX_COLS))
+    logger.info("Saved %d groups to %s", len(constraints), path)
 
 
-def simulated_annealing(board, constraints, all_selected_groups, temperature, cooling_rate, iterations):
-    # Solves the Sudoku puzzle using simulated annealing.
-    if fitness(board, constraints) == 0:
-        print("Initial board is already a correct solution. No iterations needed.")
-        return board , True
+def load_groups(path):
+    # Loads a saved puzzle back into GUI groups ([cell, ..., sum]).
+    _, constraints, size, box = load_puzzle(path)
+    if size != GRID_SIZE or box != (BOX_ROWS, BOX_COLS):
+        raise CorpusError("%s is a %dx%d puzzle; this board is %dx%d" % (path, size, size, GRID_SIZE, GRID_SIZE))
+    logger.info("Loaded %d groups from %s", len(constraints), path)
+    return [sorted(cells) + ([target_sum] if target_sum else []) for cells, target_sum in constraints]
 
-    best_board = board.copy()
-    best_score = fitness(board, constraints)
-    while temperature > 0.0 and iterations > 0:
-        for _ in range(iterations):
-            new_board, (i1, j1), (i2, j2) = select_neighbor(board)
-            
-            new_score = fitness(new_board, constraints)
-            delta_e = new_score - best_score
-
-            if delta_e < 0 or random.random() < np.exp(-delta_e / temperature):
-                best_score = new_score
-                best_board = new_board.copy()
-            else:
-                best_board[i1][j1], best_board[i2][j2] = best_board[i2][j2], best_board[i1][j1]
-
-            if fitness(best_board, constraints) == 0:
-                print("Correct solution found. Stopping iterations.")
-                return best_board , True
-
-        # Print the board after each iteration
-        print("Current board:")
-        for row in best_board:
-            print([max(1, min(4, num)) for num in row])  
-        
-        draw_grid(all_selected_groups,best_board)
 
-        pygame.display.flip()
-        
-        time.sleep(0.1)
-        temperature *= cooling_rate
-        
-        iterations -= 1  
-        
-        if temperature <= 0.0:
-            break
-                
-    return best_board , False
-
-# Frontend
 def draw_grid(selected_group, solution=None, draw=True):
-    window.fill(WHITE) 
-    font = pygame.font.Font(None, 36)  
-
-    if draw:
-        for i in range(GRID_SIZE):
-            for j in range(GRID_SIZE):
-                rect = pygame.Rect(j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                pygame.draw.rect(window, BLACK, rect, 1)
-
-    if selected_group:
-        for group in selected_group:
-            for i, j in group[:-1]:  
-                if i < GRID_SIZE - 1 and (i + 1, j) in group:
-                    pygame.draw.line(window, WHITE, (j * CELL_SIZE+1, (i + 1) * CELL_SIZE),
-                                     ((j + 1) * CELL_SIZE-2, (i + 1) * CELL_SIZE), 3) 
-                if j < GRID_SIZE - 1 and (i, j + 1) in group:
-                    pygame.draw.line(window, WHITE, ((j + 1) * CELL_SIZE, i * CELL_SIZE +1),
-                                     ((j + 1) * CELL_SIZE, (i + 1) * CELL_SIZE - 2), 3)  
-
-            first_cell = group[0]
-            if not isinstance(group[-1], tuple):
-                sum_value = group[-1]
-                if sum_value != 0:  
-                    sum_text = str(sum_value)
-                    font = pygame.font.Font(None, 36)
-                    text_surface = font.render(sum_text, True, BLACK)
-
-                    text_rect = text_surface.get_rect(
-                        topleft=(first_cell[1] * CELL_SIZE + 2, first_cell[0] * CELL_SIZE + 2)
-                    )
-
-                    window.blit(text_surface, text_rect)
-
-                    line_length = 3  
-                    pygame.draw.line(window, BLACK, (text_rect.right + 3, text_rect.top -1), (text_rect.right + 3, text_rect.bottom + line_length), 3)
-                    pygame.draw.line(window, BLACK, (text_rect.left - 1, text_rect.bottom + 2), (text_rect.right + line_length, text_rect.bottom + 2), 3)
-
-    if solution:
-        for i in range(len(solution)):
-            for j in range(len(solution[i])):
-                cell_value = solution[i][j]
-                if isinstance(cell_value, int):
-                    cell_value = str(cell_value)
-                    text_surface = font.render(cell_value, True, BLACK)
-                    text_rect = text_surface.get_rect(
-                        center=(j * CELL_SIZE + CELL_SIZE // 2, i * CELL_SIZE + CELL_SIZE // 2)
-                    )
-                    window.blit(text_surface, text_rect)
-
-    all_cells = [(i, j) for i in range(GRID_SIZE) for j in range(GRID_SIZE)]
-    cells_in_groups = [cell for group in selected_group for cell in group[:-1]]
-    
-    all_cells_included = set(all_cells) == set(cells_in_groups)
-    all_groups_have_int = all(isinstance(group[-1], int) for group in selected_group if group)  
-    
-    return all_cells_included, all_groups_have_int
+    # Redraws the whole grid from the renderer's cached background and glyphs.
+    renderer.draw(selected_group, solution, draw)
 
 def show_button():
     button_width = 100
@@ -223,7 +129,7 @@ def show_button():
     button_rect = pygame.Rect((WINDOW_WIDTH - button_width) // 2, WINDOW_HEIGHT - 70, button_width, button_height)
     pygame.draw.rect(window, (0, 255, 0), button_rect)
 
-    font = pygame.font.Font(None, 36)
+    font = get_font(None, FONT_SIZE)
     text_surface = font.render("Solve", True, BLACK)
     text_rect = text_surface.get_rect(center=button_rect.center)
     window.blit(text_surface, text_rect)
@@ -234,9 +140,7 @@ def show_sum(sum_value, group):
     first_cell = group[0]
 
     if sum_value != 0:  
-        sum_text = str(sum_value)
-        font = pygame.font.Font(None, 36)
-        text_surface = font.render(sum_text, True, BLACK)
+        text_surface = renderer.glyph(str(sum_value))
         text_rect = text_surface.get_rect(
             topleft=(first_cell[1] * CELL_SIZE + 2, first_cell[0] * CELL_SIZE + 2)
         )
@@ -250,22 +154,24 @@ def draw_pause_screen():
 
 
     def draw_instructions():
-        title_font = pygame.font.SysFont("comic sans ms", 20) 
-        title_text = "KILLER SUDOKU MAKER/SOLVER 4X4"
+        title_font = get_font("comic sans ms", 20, True) 
+        title_text = "KILLER SUDOKU MAKER/SOLVER %dX%d" % (GRID_SIZE, GRID_SIZE)
         title_surface = title_font.render(title_text, True, BLACK)
         title_rect = title_surface.get_rect(midtop=(WINDOW_WIDTH // 2, 30))
         window.blit(title_surface, title_rect)
 
         # Draw instructions text
-        font = pygame.font.SysFont("comic sans ms", 15) 
+        font = get_font("comic sans ms", 15, True) 
         instructions_text = [
             "Instructions:",
             '"Right mouse click" to GROUP cells',
             '"Left mouse click" to highlight GROUPED cells',
             '"Input" sum on highlighted group',
             '"Enter" to save GROUP / SUM',
-            '"R" to RESET',
-            '"P" to pause / show instructions again'
+            '"R" to RESET ("Esc" cancels a running solve)',
+            '"P" to pause / show instructions again',
+            '"E" to switch solver engine',
+            '"S" to SAVE / "L" to LOAD the puzzle'
         ]
         y_offset = title_rect.bottom + 40  
         for line in instructions_text:
@@ -279,7 +185,7 @@ def draw_pause_screen():
 
     play_button = pygame.Rect(WINDOW_WIDTH // 2 - 50, WINDOW_HEIGHT // 2 + 100, 100, 50)
     pygame.draw.rect(window, GREEN, play_button)
-    font = pygame.font.SysFont(None, 30)
+    font = get_font(None, 30, True)
     play_text = font.render("Play", True, BLACK)
     text_rect = play_text.get_rect(center=play_button.center)
     window.blit(play_text, text_rect)
@@ -289,7 +195,7 @@ def draw_result(is_correct):
     overlay.set_alpha(128)  
     overlay.fill(WHITE)
     window.blit(overlay, (0, 0))
-    font = pygame.font.SysFont("comic sans ms", 25)
+    font = get_font("comic sans ms", 25, True)
 
     if is_correct:
         text1 = font.render("Found a solution", True, BLACK)
@@ -314,9 +220,14 @@ def draw_result(is_correct):
     window.blit(text1, text1_rect)
     window.blit(text2, text2_rect)
     
-def main():
+def main(size=GRID_SIZE, box=None, puzzle_file=PUZZLE_FILE, load=False):
+    # load starts from the puzzle saved in puzzle_file.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    configure(size, box)
+    init_display()
     grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-    all_selected_groups = []  
+    all_selected_groups = load_groups(puzzle_file) if load else []
+    puzzle = compile_groups(all_selected_groups)
     selected_group = []
     highlighted_green = []
     draw_grid(selected_group)
@@ -328,9 +239,55 @@ def main():
     result = False
     result_pause = False
     solution_local = []
+    engine = a_engine
+    solver_job = None
+    clock = pygame.time.Clock()
 
     while running:
-        if not paused and not result:
+        if solver_job is not None:
+            # Solving in the background: keep handling events and show the latest board
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    solver_job.cancel()
+                    running = False
+                elif event.type == pygame.KEYDOWN and event.key in (pygame.K_ESCAPE, pygame.K_r):
+                    solver_job.cancel()
+                    solver_job = None
+                    solve_finished = False
+                    button_displayed = False
+                    if event.key == pygame.K_r:
+                        all_selected_groups.clear()
+                        puzzle = compile_groups(all_selected_groups)
+                        current_sum = 0
+                        selected_group = []
+                        solution_local.clear()
+                        result_pause = False
+                        logger.info("Reseted")
+                    else:
+                        logger.info("Solve cancelled")
+                    draw_grid(all_selected_groups)
+                    break
+
+            if solver_job is not None:
+                progress = solver_job.latest()
+                if progress is not None:
+                    # Cells are tinted by their conflicts, hottest where the solver is still working
+                    with solver_instrument.phase("rendering"):
+                        renderer.update_cells(all_selected_groups, progress[0],
+                                              cell_conflicts(progress[0], solver_job.constraints))
+                if not solver_job.done:
+                    # Only the changed cells were pushed to the screen; skip the full flip
+                    clock.tick(FPS)
+                    continue
+                solution, is_correct = finish_solver(solver_job)
+                solver_job = None
+                solution_local = [sublist[:] for sublist in solution]
+                logger.info("Final solution: %s", solution)
+                solve_finished = True
+                result = True
+                result_pause = True
+
+        elif not paused and not result:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
@@ -339,25 +296,22 @@ def main():
                         if event.button == 1: # Left click
                             x, y = pygame.mouse.get_pos()
                             row, column = y // CELL_SIZE, x // CELL_SIZE  
-                            for group in all_selected_groups:
+                            if all_selected_groups:
                                 draw_grid(all_selected_groups)
-                                if (row, column) in group:
-                                    highlighted_green = []
-                                    current_sum = 0
-                                    for cell in group:
-                                        if isinstance(cell, tuple):  
-                                            pygame.draw.rect(window, GREEN,
-                                                            (cell[1] * CELL_SIZE, cell[0] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-                                            highlighted_green.append((cell[0], cell[1]))
-
-                                    pygame.display.flip()  
-                                    break  
+                            cage = puzzle.cage_at(row, column)
+                            if cage >= 0:
+                                highlighted_green = []
+                                current_sum = 0
+                                for cell in puzzle.cage_cells[cage]:
+                                    pygame.draw.rect(window, GREEN,
+                                                    (cell[1] * CELL_SIZE, cell[0] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+                                    highlighted_green.append((cell[0], cell[1]))
                         elif event.button == 3:  # Right click
                             highlighted_green = []
                             current_sum = []
                             x, y = pygame.mouse.get_pos()
                             row, column = y // CELL_SIZE, x // CELL_SIZE  
-                            if (row, column) not in [cell for group in all_selected_groups for cell in group]:  # Check if cell is not part of any group
+                            if not puzzle.covers(row, column):  # Check if cell is not part of any group
                                 if (row, column) in selected_group:
                                     selected_group.remove((row, column)) 
                                     draw_grid(all_selected_groups)
@@ -367,42 +321,32 @@ def main():
                         x, y = pygame.mouse.get_pos()
                         if button_rect.collidepoint(x, y):  
                             # Convert to new format
-                            new_constraints = []
-                            for group  in all_selected_groups:
-                                coordinates = group [:-1]  
-                                value = group [-1]  
-                                new_constraints.append((coordinates, value))
-                            board = generate_board()
-                            solution , is_correct = simulated_annealing(board, new_constraints, all_selected_groups, a_temperature, a_cooling_rate, a_iterations )
-                            print("Final solution:")
-                            solution_local = [sublist[:] for sublist in solution]
-                            for row in solution:
-                                print(row)
+                            new_constraints = constraints_from_groups(all_selected_groups)
+                            solver_job, solver_instrument = start_solver(new_constraints, engine)
                             solve_finished = True
-                            result = True
-                            result_pause = True
+                            draw_grid(all_selected_groups)
 
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_RETURN:
                         if selected_group:
                             sorted_groups = sorted(selected_group)
                             all_selected_groups.append(sorted_groups[:])  
+                            puzzle = compile_groups(all_selected_groups)
                             selected_group = []
                             draw_grid(all_selected_groups)
 
                         if highlighted_green:
                             group_found = False
 
-                            if highlighted_green in all_selected_groups and current_sum != 0:
-                                for group in all_selected_groups:
-                                    if highlighted_green == group:
-
-                                        group.append(current_sum)
-                                        group_found = True
-                                        current_sum = 0
-                                        highlighted_green = []
-                                        draw_grid(all_selected_groups)
-                                        break
+                            cage = puzzle.cage_at(*highlighted_green[0])
+                            # Only a group without a sum yet equals its highlighted cells
+                            if cage >= 0 and current_sum != 0 and all_selected_groups[cage] == highlighted_green:
+                                all_selected_groups[cage].append(current_sum)
+                                puzzle = compile_groups(all_selected_groups)
+                                group_found = True
+                                current_sum = 0
+                                highlighted_green = []
+                                draw_grid(all_selected_groups)
 
                             if not group_found:
                                 current_sum = 0
@@ -415,12 +359,13 @@ def main():
                             show_sum(current_sum,highlighted_green)
                     elif event.key == pygame.K_r:
                         all_selected_groups.clear()
+                        puzzle = compile_groups(all_selected_groups)
                         current_sum = 0
                         button_displayed = False
                         selected_group = []
                         solution_local.clear()
                         result_pause = False
-                        print("Reseted")
+                        logger.info("Reseted")
 
                         draw_grid(all_selected_groups)
 
@@ -431,25 +376,37 @@ def main():
                             show_sum(current_sum, highlighted_green)  
                     elif event.key == pygame.K_p:  
                         paused = not paused  
+                    elif event.key == pygame.K_e:
+                        engine = ENGINES[(ENGINES.index(engine) + 1) % len(ENGINES)]
+                        logger.info("Solver: %s", engine)
+                    elif event.key == pygame.K_s:
+                        try:
+                            save_groups(puzzle_file, all_selected_groups)
+                        except (OSError, ValueError) as error:
+                            logger.warning("Could not save: %s", error)
+                    elif event.key == pygame.K_l:
+                        try:
+                            loaded_groups = load_groups(puzzle_file)
+                        except (OSError, ValueError) as error:
+                            logger.warning("Could not load: %s", error)
+                        else:
+                            all_selected_groups[:] = loaded_groups
+                            puzzle = compile_groups(all_selected_groups)
+                            current_sum = 0
+                            button_displayed = False
+                            selected_group = []
+                            highlighted_green = []
+                            solution_local.clear()
+                            result_pause = False
+                            draw_grid(all_selected_groups)
 
             for cell in selected_group:
                 pygame.draw.rect(window, RED, (cell[1] * CELL_SIZE, cell[0] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
 
             
-            all_cells = [(i, j) for i in range(GRID_SIZE) for j in range(GRID_SIZE)]
-            cells_in_groups = [cell for group in all_selected_groups for cell in group[:-1]]
-            
-            all_cells_included = set(all_cells) == set(cells_in_groups)
-            all_groups_have_int = all(isinstance(group[-1], int) for group in all_selected_groups if group)  # Only check non-empty groups
-            
-            if all_cells_included and all_groups_have_int and not button_displayed and not solve_finished:
+            if puzzle.is_complete() and not button_displayed and not solve_finished:
                 button_rect = show_button()
                 button_displayed = True  
-                pygame.display.flip()
-            else:
-                pygame.display.flip()
-
-            pass
         elif paused:
             draw_pause_screen()
             for event in pygame.event.get():
@@ -464,7 +421,7 @@ def main():
                             draw_grid(all_selected_groups,solution_local)
                         if not result_pause:
                             draw_grid(all_selected_groups)
-                            print("play")
+                            logger.debug("play")
 
 
         elif result:
@@ -476,8 +433,9 @@ def main():
                     button_result = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
                     if button_result.collidepoint(x, y):
                         if not is_correct:
-                            board = generate_board()
-                            solution, is_correct = simulated_annealing(board, new_constraints, all_selected_groups, a_temperature, a_cooling_rate, a_iterations)
+                            solver_job, solver_instrument = start_solver(new_constraints, engine)
+                            result = False
+                            draw_grid(all_selected_groups)
                         else:
                             draw_grid(all_selected_groups, solution)
                             result = False
@@ -486,6 +444,7 @@ def main():
                         break
                 elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
                     all_selected_groups.clear()
+                    puzzle = compile_groups(all_selected_groups)
                     current_sum = 0
                     button_displayed = False
                     selected_group = []
@@ -493,8 +452,7 @@ def main():
                     solve_finished = False
                     solution_local.clear()
                     result_pause = False
-                    print("Reseted")
-                    print(solution_local)
+                    logger.info("Reseted")
                     draw_grid(all_selected_groups)
                     pygame.display.flip()
 
@@ -505,6 +463,7 @@ def main():
                     
         
         pygame.display.flip()
+        clock.tick(FPS)
 
 
     pygame.quit()
@@ -512,4 +471,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # Optional board size or saved puzzle, e.g. "python ai_act2.py 9" or
+    # "python ai_act2.py my_puzzle.kspz" (which "S" then saves back to)
+    argument = sys.argv[1] if len(sys.argv) > 1 else None
+    if argument is None:
+        main()
+    elif argument.isdigit():
+        main(int(argument))
+    elif is_corpus(argument):
+        _, _, saved_size, saved_box = load_puzzle(argument)
+        main(saved_size, saved_box, argument, load=True)
+    else:
+        main(GRID_SIZE, None, argument)
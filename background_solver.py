@@ -0,0 +1,83 @@
+# Solving on a background thread.
+#
+# BackgroundSolve runs solve() on a worker thread so an event loop (the
+# pygame GUI) never blocks. Intermediate boards are streamed through a small
+# queue that the caller drains at its own frame rate, and cancel() stops the
+# worker at its next progress step.
+
+import logging
+import queue
+import threading
+
+from solver import SolveCancelled, solve
+
+logger = logging.getLogger("solver")
+
+
+class BackgroundSolve:
+    # One solve running on a daemon thread.
+    #
+    #   job = BackgroundSolve(constraints, engine="exact").start()
+    #   while not job.done:
+    #       progress = job.latest()   # (board, score, temperature) or None
+    #   job.result                    # SolveResult, or None if cancelled/failed
+
+    def __init__(self, constraints, **options):
+        self.constraints = constraints
+        self.options = options
+        self.progress = queue.Queue(maxsize=2)
+        self.cancelled = threading.Event()
+        self.result = None
+        self.error = None
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="solver", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = solve(self.constraints, on_step=self._on_step, cancel=self.cancelled,
+                                **self.options)
+        except SolveCancelled:
+            logger.info("Solve cancelled")
+        except Exception as error:
+            self.error = error
+            logger.exception("Solve failed")
+        finally:
+            self._finished.set()
+
+    def _on_step(self, board, score, temperature):
+        item = ([row[:] for row in board], score, temperature)
+        while True:
+            try:
+                self.progress.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            # The consumer is behind and only ever shows the newest board, so
+            # the oldest one makes room for it
+            try:
+                self.progress.get_nowait()
+            except queue.Empty:
+                pass
+
+    def latest(self):
+        # Drains the queue and returns the newest progress, or None.
+        newest = None
+        while True:
+            try:
+                newest = self.progress.get_nowait()
+            except queue.Empty:
+                return newest
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def done(self):
+        return self._finished.is_set()
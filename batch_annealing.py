@@ -0,0 +1,214 @@
+# Batched simulated annealing.
+#
+# Runs many independent annealing chains at once as one (chains, N*N) numpy
+# array: every Python-level iteration proposes one in-box swap per chain,
+# scores all proposals incrementally and applies a vectorized Metropolis
+# test. Like solver.SwapScorer, each chain keeps digit counts per row and
+# column and its cage sums, so a swap's delta reads only the two rows, two
+# columns and two cages it touches instead of rescoring the whole board.
+# Scores match solver.fitness().
+
+import time
+
+import numpy as np
+
+from grid import box_origins, resolve_box
+from schedules import make_schedule
+
+
+class BatchProblem:
+    # Precomputed index tables for one puzzle: the flat cell indices of every
+    # box and a (cages, cells) membership matrix used to sum all cages of all
+    # chains with a single matrix product.
+
+    def __init__(self, constraints, size, box=None):
+        box_rows, box_cols = resolve_box(size, box)
+        self.size = size
+        self.box_cells = np.array([[(qi + i) * size + qj + j
+                                    for i in range(box_rows) for j in range(box_cols)]
+                                   for qi, qj in box_origins(size, (box_rows, box_cols))])
+        self.membership = np.zeros((len(constraints), size * size), dtype=np.int32)
+        for cage, (cells, _) in enumerate(constraints):
+            for row, col in cells:
+                self.membership[cage, row * size + col] = 1
+        self.targets = np.array([target_sum for _, target_sum in constraints], dtype=np.int32)
+        # Cage of every cell for the incremental deltas; cells in no cage
+        # point at an extra cage that is never counted
+        self.cage_of = np.full(size * size, len(constraints))
+        for cage, (cells, _) in enumerate(constraints):
+            for row, col in cells:
+                self.cage_of[row * size + col] = cage
+        self.counted = np.append(np.ones(len(constraints), dtype=np.int32), 0)
+        self.cage_targets = np.append(self.targets, 0)
+        self.row_of = np.arange(size * size) // size
+        self.col_of = np.arange(size * size) % size
+
+    def random_boards(self, chains, rng):
+        # (chains, N*N) boards where every box holds each digit once.
+        size = self.size
+        boards = np.empty((chains, size * size), dtype=np.int32)
+        for cells in self.box_cells:
+            boards[:, cells] = rng.random((chains, size)).argsort(axis=1) + 1
+        return boards
+
+    def scores(self, boards):
+        # Fitness of every board: repeated digits per row and per column plus
+        # the number of cages with the wrong sum.
+        size = self.size
+        grids = boards.reshape(-1, size, size)
+        row_repeats = (np.diff(np.sort(grids, axis=2), axis=2) == 0).sum(axis=(1, 2))
+        col_repeats = (np.diff(np.sort(grids, axis=1), axis=1) == 0).sum(axis=(1, 2))
+        cage_misses = (boards @ self.membership.T != self.targets).sum(axis=1)
+        return row_repeats + col_repeats + cage_misses
+
+    def tallies(self, boards):
+        # (row counts, column counts, cage sums) of every board: counts are
+        # (chains, N, N+1) arrays indexed by line and digit, cage sums
+        # (chains, cages + 1) with the uncounted extra cage last.
+        size = self.size
+        grids = boards.reshape(-1, size, size)
+        digits = np.arange(size + 1)
+        row_counts = (grids[:, :, :, None] == digits).sum(axis=2, dtype=np.int32)
+        col_counts = (grids[:, :, :, None] == digits).sum(axis=1, dtype=np.int32)
+        cage_sums = np.zeros((len(boards), len(self.counted)), dtype=np.int32)
+        cage_sums[:, :-1] = boards @ self.membership.T
+        return row_counts, col_counts, cage_sums
+
+    def deltas(self, tallies, chain_ids, cell1, cell2, value1, value2):
+        # Score change of swapping cell1 and cell2 (same box) on every chain.
+        row_counts, col_counts, cage_sums = tallies
+        delta = (_line_deltas(row_counts, chain_ids, self.row_of[cell1], self.row_of[cell2], value1, value2)
+                 + _line_deltas(col_counts, chain_ids, self.col_of[cell1], self.col_of[cell2], value1, value2))
+        cage1, cage2 = self.cage_of[cell1], self.cage_of[cell2]
+        change = value2 - value1
+        misses = 0
+        for cage, shift in ((cage1, change), (cage2, -change)):
+            sums, targets = cage_sums[chain_ids, cage], self.cage_targets[cage]
+            misses = misses + ((sums + shift != targets).astype(np.int32) - (sums != targets)) * self.counted[cage]
+        return delta + np.where(cage1 != cage2, misses, 0)
+
+    def swap(self, boards, tallies, chain_ids, cell1, cell2, value1, value2):
+        # Applies the swaps of the given chains to their boards and tallies.
+        row_counts, col_counts, cage_sums = tallies
+        boards[chain_ids, cell1] = value2
+        boards[chain_ids, cell2] = value1
+        for counts, line1, line2 in ((row_counts, self.row_of[cell1], self.row_of[cell2]),
+                                     (col_counts, self.col_of[cell1], self.col_of[cell2])):
+            counts[chain_ids, line1, value1] -= 1
+            counts[chain_ids, line1, value2] += 1
+            counts[chain_ids, line2, value2] -= 1
+            counts[chain_ids, line2, value1] += 1
+        change = value2 - value1
+        cage_sums[chain_ids, self.cage_of[cell1]] += change
+        cage_sums[chain_ids, self.cage_of[cell2]] -= change
+
+
+def _line_deltas(counts, chain_ids, line1, line2, value1, value2):
+    # Repeat change in two lines when value1 moves from line1 to line2 and
+    # value2 the other way; zero where both cells share the line.
+    delta = ((counts[chain_ids, line1, value2] > 0).astype(np.int32) - (counts[chain_ids, line1, value1] > 1)
+             + (counts[chain_ids, line2, value1] > 0) - (counts[chain_ids, line2, value2] > 1))
+    return np.where(line1 != line2, delta, 0)
+
+
+def batch_annealing(constraints, temperature, cooling_rate, iterations, size=4, box=None,
+                    chains=256, seed=None, on_step=None, stats=None, instrument=None,
+                    schedule=None, time_limit=None):
+    # Anneals 'chains' boards together with the same schedule as
+    # solver.simulated_annealing. Returns (board, True) as soon as any chain
+    # reaches fitness 0, else (best board seen, False).
+    # on_step(board, score, temperature) gets the current best chain after
+    # every temperature step. stats and instrument work as in
+    # solver.simulated_annealing, counting every chain's proposal. schedule
+    # is a schedules name or object; its acceptance ratio is over all chains.
+    # time_limit, in seconds, is checked after every temperature step.
+    if stats is None:
+        stats = {}
+    for counter in ("proposals", "acceptances", "uphill_acceptances", "fitness_calls", "steps",
+                    "reheats"):
+        stats.setdefault(counter, 0)
+    stats["chains"] = chains
+    timed = instrument is not None and instrument.timing
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    deadline = None if time_limit is None else started + time_limit
+
+    rng = np.random.default_rng(seed)
+    problem = BatchProblem(constraints, size, box)
+    boards = problem.random_boards(chains, rng)
+    scores = problem.scores(boards)
+    tallies = problem.tallies(boards)
+    stats["fitness_calls"] += chains
+    chain_ids = np.arange(chains)
+    box_count, box_size = problem.box_cells.shape
+
+    def board_of(chain):
+        return boards[chain].reshape(size, size).tolist()
+
+    best = int(scores.argmin())
+    best_score = int(scores[best])
+    best_board = board_of(best)
+    if best_score == 0:
+        return best_board, True
+
+    schedule = make_schedule(schedule)
+    step = schedule.start(temperature, cooling_rate, iterations)
+    while step is not None:
+        temperature, iterations = step
+        step_proposals, step_acceptances = stats["proposals"], stats["acceptances"]
+        for _ in range(iterations):
+            if timed:
+                t0 = perf_counter()
+            boxes = rng.integers(box_count, size=chains)
+            cell1 = problem.box_cells[boxes, rng.integers(box_size, size=chains)]
+            cell2 = problem.box_cells[boxes, rng.integers(box_size, size=chains)]
+            value1 = boards[chain_ids, cell1]
+            value2 = boards[chain_ids, cell2]
+            stats["proposals"] += chains
+            if timed:
+                t1 = perf_counter()
+                instrument.add_time("neighbor", t1 - t0)
+
+            delta_e = problem.deltas(tallies, chain_ids, cell1, cell2, value1, value2)
+            stats["fitness_calls"] += chains
+            if timed:
+                t2 = perf_counter()
+                instrument.add_time("scoring", t2 - t1)
+
+            accept = (delta_e <= 0) | (rng.random(chains) < np.exp(-np.maximum(delta_e, 0) / temperature))
+            stats["acceptances"] += int(accept.sum())
+            stats["uphill_acceptances"] += int((accept & (delta_e > 0)).sum())
+
+            moved = chain_ids[accept]
+            problem.swap(boards, tallies, moved, cell1[accept], cell2[accept], value1[accept], value2[accept])
+            scores = scores + np.where(accept, delta_e, 0)
+
+            chain = int(scores.argmin())
+            if timed:
+                instrument.add_time("acceptance", perf_counter() - t2)
+            if scores[chain] < best_score:
+                best_score = int(scores[chain])
+                best_board = board_of(chain)
+                if best_score == 0:
+                    stats["reheats"] += schedule.reheats
+                    return best_board, True
+
+        stats["steps"] += 1
+        chain = int(scores.argmin())
+        if instrument is not None:
+            instrument.emit("step", step=stats["steps"], temperature=temperature,
+                            score=int(scores[chain]), best_score=best_score,
+                            proposals=stats["proposals"], acceptances=stats["acceptances"],
+                            uphill_acceptances=stats["uphill_acceptances"],
+                            fitness_calls=stats["fitness_calls"], elapsed=perf_counter() - started)
+        if on_step is not None:
+            on_step(board_of(chain), int(scores[chain]), temperature)
+        if deadline is not None and perf_counter() > deadline:
+            break
+
+        step = schedule.next_step(stats["proposals"] - step_proposals,
+                                  stats["acceptances"] - step_acceptances, best_score)
+
+    stats["reheats"] += schedule.reheats
+    return best_board, False
+
@@ -0,0 +1,174 @@
+# Batch solving from the command line.
+#
+# Reads puzzles as JSON lines from a file or stdin and writes one JSON result
+# line per puzzle as soon as it is available. Only a bounded window of
+# puzzles is held in memory at a time, so arbitrarily large inputs stream.
+#
+# Each input line is either a list of constraints in the (cells, target_sum)
+# shape main() builds, e.g. [[[[0, 0], [0, 1]], 3], ...], or an object
+# {"id": ..., "constraints": [...], "size": 9, "box": [3, 3]}. A binary corpus
+# (corpus_format.py) is read through its memory map instead, with no parsing.
+#
+#   python batch_cli.py puzzles.jsonl -o results.jsonl --engine exact --workers 4
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from corpus_format import CorpusReader, is_corpus
+from solution_cache import SolutionCache
+from solver import ENGINES, GRID_SIZE, solve
+
+# One SolutionCache per cache file in each process
+_caches = {}
+
+
+def parse_puzzle(line, default_size=GRID_SIZE):
+    # Turns one JSON line into (puzzle_id, constraints, size, box).
+    return puzzle_from_data(json.loads(line), default_size)
+
+
+def puzzle_from_data(data, default_size=GRID_SIZE):
+    # Same as parse_puzzle() for an already decoded list or object.
+    if isinstance(data, dict):
+        puzzle_id = data.get("id")
+        raw_constraints = data["constraints"]
+        size = data.get("size", default_size)
+        box = tuple(data["box"]) if data.get("box") else None
+    else:
+        puzzle_id = None
+        raw_constraints = data
+        size = default_size
+        box = None
+    if not isinstance(size, int) or size < 1:
+        raise ValueError("size must be a positive integer, not %r" % (size,))
+    constraints = [([tuple(cell) for cell in cells], target_sum)
+                   for cells, target_sum in raw_constraints]
+    for cells, _ in constraints:
+        for cell in cells:
+            if len(cell) != 2 or not all(isinstance(value, int) and 0 <= value < size for value in cell):
+                raise ValueError("cell %r is not on a %dx%d grid" % (list(cell), size, size))
+    return puzzle_id, constraints, size, box
+
+
+def cache_for(path):
+    if path is None:
+        return None
+    if path not in _caches:
+        _caches[path] = SolutionCache(path)
+    return _caches[path]
+
+
+def solve_line(index, line, options):
+    # Solves one input line, or an already decoded (puzzle_id, constraints,
+    # size, box) puzzle, and returns its output record.
+    start = time.perf_counter()
+    try:
+        if isinstance(line, str):
+            puzzle_id, constraints, size, box = parse_puzzle(line, options["size"])
+        else:
+            puzzle_id, constraints, size, box = line
+        result = solve(constraints, engine=options["engine"], time_limit=options["time_limit"],
+                       seed=options["seed"], size=size, box=box,
+                       cache=cache_for(options.get("cache")))
+    except (ValueError, KeyError, TypeError) as error:
+        return {"index": index, "error": str(error)}
+    record = {"index": index, "solved": result.solved,
+              "solution": result.solution if result.solved else None,
+              "stats": result.stats, "time": time.perf_counter() - start}
+    if puzzle_id is not None:
+        record["id"] = puzzle_id
+    return record
+
+
+def read_lines(stream):
+    # Yields (index, line) for every non-blank input line.
+    index = 0
+    for line in stream:
+        if line.strip():
+            yield index, line
+            index += 1
+
+
+def run_batch(lines, write, options, workers=1, order="input", window=None):
+    # Solves (index, line) pairs (or (index, puzzle) pairs) and calls
+    # write(record) for each result.
+    # order is "input" (results in input order) or "completion" (as soon as
+    # each finishes). At most 'window' puzzles are in flight or buffered.
+    if workers <= 1:
+        for index, line in lines:
+            write(solve_line(index, line, options))
+        return
+
+    if window is None:
+        window = workers * 4
+    next_to_write = 0
+    finished = {}
+    pending = set()
+    lines = iter(lines)
+    exhausted = False
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while not exhausted and len(pending) + len(finished) < window:
+                item = next(lines, None)
+                if item is None:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(solve_line, item[0], item[1], options))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if order == "completion":
+                    write(record)
+                else:
+                    finished[record["index"]] = record
+            while next_to_write in finished:
+                write(finished.pop(next_to_write))
+                next_to_write += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a JSON-lines file of Killer Sudoku puzzles.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="JSON-lines or binary corpus file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="result file, or - for stdout")
+    parser.add_argument("--engine", choices=ENGINES, default="exact")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--order", choices=("input", "completion"), default="input")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per puzzle")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--size", type=int, default=GRID_SIZE, help="board size when a puzzle gives none")
+    parser.add_argument("--cache", metavar="PATH", help="sqlite solution cache shared across runs")
+    args = parser.parse_args(argv)
+
+    options = {"engine": args.engine, "time_limit": args.time_limit, "seed": args.seed,
+               "size": args.size, "cache": args.cache}
+    if args.input != "-" and is_corpus(args.input):
+        source = CorpusReader(args.input)
+        lines = enumerate(source)
+    else:
+        source = sys.stdin if args.input == "-" else open(args.input)
+        lines = read_lines(source)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+
+    def write(record):
+        sink.write(json.dumps(record) + "\n")
+        sink.flush()
+
+    try:
+        run_batch(lines, write, options, args.workers, args.order)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+
+if __name__ == "__main__":
+    main()
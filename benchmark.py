@@ -0,0 +1,235 @@
+# Benchmark harness for the solver engines and annealing schedules.
+#
+# Runs every configuration over a corpus of puzzles and reports success rate,
+# median/p95/p99 time-to-solution, iterations and fitness evaluations (or
+# search nodes) per second. Results can be saved as a baseline and later runs
+# compared against it, failing when they regress.
+#
+#   python benchmark.py                          # bench_corpus.jsonl, default configs
+#   python benchmark.py --save baseline.json
+#   python benchmark.py --compare baseline.json
+#   python benchmark.py --make-corpus bench_corpus.jsonl
+
+import argparse
+import gc
+import json
+import random
+import sys
+
+from batch_cli import parse_puzzle
+from corpus_format import SUFFIX, CorpusReader, is_corpus, write_corpus
+from generator import random_cages, random_solution
+from percentiles import percentile
+from solver import a_iterations, a_temperature, solve
+
+DEFAULT_CORPUS = "bench_corpus.jsonl"
+CORPUS_SEED = 2024
+CORPUS_SIZES = {4: 20, 6: 20, 9: 10}
+# Runs per puzzle, so every size gives enough samples for MIN_SAMPLES
+RUNS = 3
+
+# Each configuration is a name plus solve() keyword arguments
+DEFAULT_CONFIGS = [
+    ("annealing", {"engine": "annealing"}),
+    ("annealing-hot", {"engine": "annealing", "temperature": a_temperature * 2, "cooling_rate": 0.97}),
+    ("annealing-long", {"engine": "annealing", "iterations": a_iterations * 3}),
+    ("annealing-adaptive", {"engine": "annealing", "schedule": "adaptive"}),
+    ("annealing-reheat", {"engine": "annealing", "schedule": "adaptive-reheat"}),
+    ("annealing-tabu", {"engine": "annealing", "schedule": "reheat", "tabu": 2}),
+    ("min-conflicts", {"engine": "min-conflicts"}),
+    ("batch", {"engine": "batch", "chains": 256}),
+    ("exact", {"engine": "exact"}),
+    ("dlx", {"engine": "dlx"}),
+]
+
+# How much worse than the baseline a run may be before it counts as a regression
+MAX_SUCCESS_DROP = 0.05
+MAX_SLOWDOWN = 1.25
+# Slowdowns smaller than this many seconds are timer noise, not regressions,
+# and throughput is only compared for configurations that ran this long
+MIN_TIME_DELTA = 0.001
+MIN_TOTAL_TIME = 0.1
+# Median times are only compared when both runs have this many solved attempts
+MIN_SAMPLES = 20
+
+
+def build_corpus(seed=CORPUS_SEED, sizes=None):
+    # Yields the seeded benchmark puzzles as corpus records.
+    if sizes is None:
+        sizes = CORPUS_SIZES
+    rng = random.Random(seed)
+    for size, count in sorted(sizes.items()):
+        for number in range(count):
+            solution = random_solution(size, None, rng)
+            yield {"id": "%dx%d-%03d" % (size, size, number), "size": size,
+                   "constraints": random_cages(solution, rng)}
+
+
+def load_corpus(path):
+    # Reads corpus puzzles, JSON lines or binary, as (puzzle_id, constraints, size, box).
+    if is_corpus(path):
+        with CorpusReader(path) as reader:
+            return list(reader)
+    with open(path) as stream:
+        return [parse_puzzle(line) for line in stream if line.strip()]
+
+
+def timed_solve(constraints, **options):
+    # One solve with the garbage collector collected beforehand and disabled
+    # during it (as timeit does), so a collection triggered by whatever ran
+    # earlier in the process is not billed to this solve.
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return solve(constraints, **options)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def run_config(puzzles, options, runs=RUNS, seed=0):
+    # Solves every puzzle 'runs' times with one configuration and summarizes.
+    solve_times = []
+    total_time = 0.0
+    work = 0
+    evaluations = 0
+    attempts = 0
+    solved = 0
+    if puzzles:
+        # Untimed warm-up so one-off setup (e.g. combination tables) is not billed to the first puzzle
+        _, constraints, size, box = puzzles[0]
+        solve(constraints, seed=seed, size=size, box=box, **options)
+    for number, (_, constraints, size, box) in enumerate(puzzles):
+        for run in range(runs):
+            result = timed_solve(constraints, seed=seed + number * runs + run, size=size, box=box, **options)
+            attempts += 1
+            total_time += result.stats["time"]
+            stats = result.stats
+            work += stats.get("proposals", stats.get("nodes", 0))
+            # A min-conflicts move scores a whole box of swaps, so throughput
+            # counts fitness evaluations (search nodes for the exact engines)
+            evaluations += stats.get("fitness_calls", stats.get("nodes", stats.get("proposals", 0)))
+            if result.solved:
+                solved += 1
+                solve_times.append(result.stats["time"])
+    return {
+        "attempts": attempts,
+        "solved": solved,
+        "total_time": total_time,
+        "success_rate": solved / attempts if attempts else 0.0,
+        "median_time": percentile(solve_times, 0.5),
+        "p95_time": percentile(solve_times, 0.95),
+        "p99_time": percentile(solve_times, 0.99),
+        "iterations": work / attempts if attempts else 0.0,
+        "evaluations_per_second": evaluations / total_time if total_time else 0.0,
+    }
+
+
+def run_benchmark(puzzles, configs=None, runs=RUNS, seed=0, sizes=None):
+    # Returns {config name: {size: summary}} over the corpus.
+    if configs is None:
+        configs = DEFAULT_CONFIGS
+    by_size = {}
+    for puzzle in puzzles:
+        by_size.setdefault(puzzle[2], []).append(puzzle)
+    report = {}
+    for name, options in configs:
+        report[name] = {}
+        for size in sorted(by_size):
+            if sizes and size not in sizes:
+                continue
+            report[name][str(size)] = run_config(by_size[size], options, runs, seed)
+    return report
+
+
+def _solved(summary):
+    # Solved attempts of a summary; baselines saved before "solved" was recorded have only the rate.
+    return summary.get("solved", round(summary["success_rate"] * summary["attempts"]))
+
+
+def compare(report, baseline):
+    # Lists the regressions of report against baseline.
+    regressions = []
+    for name, sizes in report.items():
+        for size, summary in sizes.items():
+            before = baseline.get(name, {}).get(size)
+            if before is None:
+                continue
+            if summary["success_rate"] < before["success_rate"] - MAX_SUCCESS_DROP:
+                regressions.append("%s %sx%s: success rate %.2f -> %.2f"
+                                   % (name, size, size, before["success_rate"], summary["success_rate"]))
+            if (summary["median_time"] is not None and before["median_time"]
+                    and min(summary["solved"], _solved(before)) >= MIN_SAMPLES
+                    and summary["median_time"] > before["median_time"] * MAX_SLOWDOWN
+                    and summary["median_time"] - before["median_time"] > MIN_TIME_DELTA):
+                regressions.append("%s %sx%s: median time %.4fs -> %.4fs"
+                                   % (name, size, size, before["median_time"], summary["median_time"]))
+            if (before["evaluations_per_second"]
+                    and min(summary["total_time"], before.get("total_time", 0.0)) >= MIN_TOTAL_TIME
+                    and summary["evaluations_per_second"] * MAX_SLOWDOWN < before["evaluations_per_second"]):
+                regressions.append("%s %sx%s: evaluations/s %.0f -> %.0f"
+                                   % (name, size, size, before["evaluations_per_second"],
+                                      summary["evaluations_per_second"]))
+    return regressions
+
+
+def format_report(report):
+    def seconds(value):
+        return "-" if value is None else "%.4f" % value
+
+    lines = ["%-20s %5s %8s %9s %9s %9s %11s %12s" % (
+        "config", "size", "success", "median s", "p95 s", "p99 s", "iterations", "evals/s")]
+    for name, sizes in report.items():
+        for size, summary in sizes.items():
+            lines.append("%-20s %5s %7.0f%% %9s %9s %9s %11.0f %12.0f" % (
+                name, size, summary["success_rate"] * 100, seconds(summary["median_time"]),
+                seconds(summary["p95_time"]), seconds(summary["p99_time"]),
+                summary["iterations"], summary["evaluations_per_second"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Killer Sudoku solvers.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--make-corpus", metavar="PATH", help="write the seeded corpus to PATH (binary if it ends in %s) and exit" % SUFFIX)
+    parser.add_argument("--configs", nargs="+", help="only run these configurations")
+    parser.add_argument("--sizes", nargs="+", type=int, help="only run these board sizes")
+    parser.add_argument("--runs", type=int, default=RUNS, help="runs per puzzle per configuration")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="PATH", help="save the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail on regressions against a baseline")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.make_corpus and args.make_corpus.endswith(SUFFIX):
+        write_corpus(args.make_corpus, ((record["id"], record["constraints"], record["size"], None)
+                                        for record in build_corpus()))
+        return 0
+    if args.make_corpus:
+        with open(args.make_corpus, "w") as stream:
+            for record in build_corpus():
+                stream.write(json.dumps(record) + "\n")
+        return 0
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        configs = [(name, options) for name, options in DEFAULT_CONFIGS if name in args.configs]
+    report = run_benchmark(load_corpus(args.corpus), configs, args.runs, args.seed, args.sizes)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+    if args.save:
+        with open(args.save, "w") as stream:
+            json.dump(report, stream, indent=2)
+    if args.compare:
+        with open(args.compare) as stream:
+            regressions = compare(report, json.load(stream))
+        for line in regressions:
+            print("REGRESSION:", line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
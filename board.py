@@ -0,0 +1,170 @@
+# Compact board representation.
+#
+# A Board keeps its digits in one flat array('b') (row * size + col, 0 for
+# empty) together with per-row, per-column and per-box digit counts and
+# bitmasks (bit d set while digit d is present), all updated incrementally.
+# snapshot() is a plain bytes copy of the cells, so best-so-far tracking and
+# bulk storage cost size * size bytes per board.
+
+from array import array
+from functools import lru_cache
+
+from grid import resolve_box
+
+
+@lru_cache(maxsize=None)
+def cell_tables(size, box):
+    # Row, column and box number of every flat cell index.
+    box_rows, box_cols = box
+    boxes_per_row = size // box_cols
+    cells = range(size * size)
+    row_of = tuple(index // size for index in cells)
+    col_of = tuple(index % size for index in cells)
+    box_of = tuple((row_of[index] // box_rows) * boxes_per_row + col_of[index] // box_cols for index in cells)
+    return row_of, col_of, box_of
+
+
+@lru_cache(maxsize=None)
+def box_cell_table(size, box):
+    # Flat cell indices of every box, box by box.
+    _, _, box_of = cell_tables(size, box)
+    return tuple(tuple(index for index in range(size * size) if box_of[index] == number)
+                 for number in range(size))
+
+
+def _exchange(counts, masks, stride, line1, line2, a, b):
+    # line1 gives up digit a for b and line2 gives up b for a (0 is an
+    # empty cell and is not counted).
+    base1 = line1 * stride
+    base2 = line2 * stride
+    if a:
+        counts[base2 + a] += 1
+        masks[line2] |= 1 << a
+        counts[base1 + a] -= 1
+        if not counts[base1 + a]:
+            masks[line1] &= ~(1 << a)
+    if b:
+        counts[base1 + b] += 1
+        masks[line1] |= 1 << b
+        counts[base2 + b] -= 1
+        if not counts[base2 + b]:
+            masks[line2] &= ~(1 << b)
+
+
+class Board:
+    __slots__ = ("size", "box", "cells", "row_of", "col_of", "box_of",
+                 "row_counts", "col_counts", "box_counts", "row_masks", "col_masks", "box_masks")
+
+    def __init__(self, size, box=None, cells=None):
+        self.size = size
+        self.box = resolve_box(size, box)
+        self.row_of, self.col_of, self.box_of = cell_tables(size, self.box)
+        self.cells = array("b", cells if cells is not None else bytes(size * size))
+        self.recount()
+
+    @classmethod
+    def from_rows(cls, rows, box=None):
+        size = len(rows)
+        return cls(size, box, [value for row in rows for value in row])
+
+    def to_rows(self):
+        size = self.size
+        cells = self.cells
+        return [cells[row * size:(row + 1) * size].tolist() for row in range(size)]
+
+    def recount(self):
+        # Rebuilds the counts and masks from the cells.
+        size = self.size
+        stride = size + 1
+        self.row_counts = array("b", bytes(size * stride))
+        self.col_counts = array("b", bytes(size * stride))
+        self.box_counts = array("b", bytes(size * stride))
+        self.row_masks = [0] * size
+        self.col_masks = [0] * size
+        self.box_masks = [0] * size
+        for index, digit in enumerate(self.cells):
+            if digit:
+                self._add(index, digit)
+
+    def _add(self, index, digit):
+        stride = self.size + 1
+        bit = 1 << digit
+        row, col, box = self.row_of[index], self.col_of[index], self.box_of[index]
+        self.row_counts[row * stride + digit] += 1
+        self.col_counts[col * stride + digit] += 1
+        self.box_counts[box * stride + digit] += 1
+        self.row_masks[row] |= bit
+        self.col_masks[col] |= bit
+        self.box_masks[box] |= bit
+
+    def _remove(self, index, digit):
+        stride = self.size + 1
+        bit = 1 << digit
+        row, col, box = self.row_of[index], self.col_of[index], self.box_of[index]
+        self.row_counts[row * stride + digit] -= 1
+        self.col_counts[col * stride + digit] -= 1
+        self.box_counts[box * stride + digit] -= 1
+        if not self.row_counts[row * stride + digit]:
+            self.row_masks[row] &= ~bit
+        if not self.col_counts[col * stride + digit]:
+            self.col_masks[col] &= ~bit
+        if not self.box_counts[box * stride + digit]:
+            self.box_masks[box] &= ~bit
+
+    def get(self, row, col):
+        return self.cells[row * self.size + col]
+
+    def set(self, row, col, digit):
+        index = row * self.size + col
+        old = self.cells[index]
+        if old == digit:
+            return
+        if old:
+            self._remove(index, old)
+        self.cells[index] = digit
+        if digit:
+            self._add(index, digit)
+
+    def swap(self, index1, index2):
+        # Swaps two cells by flat index, updating only the lines that change.
+        cells = self.cells
+        a = cells[index1]
+        b = cells[index2]
+        if a == b:
+            return
+        cells[index1] = b
+        cells[index2] = a
+        # A line holding both cells keeps the same digits; within-box swaps skip the box
+        stride = self.size + 1
+        line1, line2 = self.row_of[index1], self.row_of[index2]
+        if line1 != line2:
+            _exchange(self.row_counts, self.row_masks, stride, line1, line2, a, b)
+        line1, line2 = self.col_of[index1], self.col_of[index2]
+        if line1 != line2:
+            _exchange(self.col_counts, self.col_masks, stride, line1, line2, a, b)
+        line1, line2 = self.box_of[index1], self.box_of[index2]
+        if line1 != line2:
+            _exchange(self.box_counts, self.box_masks, stride, line1, line2, a, b)
+
+    def candidates(self, row, col):
+        # Bitmask of digits not yet used in the cell's row, column or box.
+        full = ((1 << self.size) - 1) << 1
+        index = row * self.size + col
+        return full & ~(self.row_masks[self.row_of[index]] | self.col_masks[self.col_of[index]]
+                        | self.box_masks[self.box_of[index]])
+
+    def snapshot(self):
+        return self.cells.tobytes()
+
+    def restore(self, snapshot):
+        self.cells = array("b", snapshot)
+        self.recount()
+
+    def copy(self):
+        return Board(self.size, self.box, self.cells)
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.size == other.size and self.cells == other.cells
+
+    def __repr__(self):
+        return "Board(%d, %r)" % (self.size, self.to_rows())
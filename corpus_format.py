@@ -0,0 +1,250 @@
+# Binary puzzle corpus format.
+#
+# A corpus file holds any number of puzzles and is laid out as
+#
+#   header   magic b"KSPZ", version u16, reserved u16, count u64, index offset u64
+#   records  one per puzzle:
+#              size u8, box_rows u8, box_cols u8, cage count u16, id length u8,
+#              id (UTF-8), then per cage a cell bitmask of ceil(size * size / 8)
+#              bytes (bit row * size + col, little-endian, as in Puzzle.coverage)
+#              and the sum as u16 (0 for a cage without a sum yet)
+#   index    count u64 record offsets
+#
+# All integers are little-endian. CorpusReader memory-maps the file and reads
+# the index in place, so opening a corpus of millions of puzzles costs nothing
+# and any puzzle is one slice away. Puzzles come back in the same
+# (puzzle_id, constraints, size, box) shape as batch_cli.parse_puzzle().
+#
+#   python corpus_format.py bench_corpus.jsonl bench_corpus.kspz     # JSON lines -> binary
+#   python corpus_format.py bench_corpus.kspz bench_corpus.jsonl     # and back
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+from functools import lru_cache
+
+from grid import resolve_box
+
+MAGIC = b"KSPZ"
+VERSION = 1
+SUFFIX = ".kspz"
+HEADER = struct.Struct("<4sHHQQ")
+RECORD = struct.Struct("<BBBHB")
+CAGE_SUM = struct.Struct("<H")
+INDEX_ENTRY = struct.Struct("<Q")
+
+
+class CorpusError(ValueError):
+    # Raised for files that are not valid puzzle corpora.
+    pass
+
+
+def is_corpus(path):
+    # True if the file starts with the corpus magic.
+    try:
+        with open(path, "rb") as stream:
+            return stream.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def encode_puzzle(constraints, size, box=None, puzzle_id=None):
+    # One puzzle as record bytes.
+    box_rows, box_cols = resolve_box(size, box)
+    name = (puzzle_id or "").encode("utf-8")
+    if len(name) > 255:
+        raise ValueError("puzzle id too long: %r" % (puzzle_id,))
+    mask_bytes = (size * size + 7) // 8
+    parts = [RECORD.pack(size, box_rows, box_cols, len(constraints), len(name)), name]
+    for cells, target_sum in constraints:
+        mask = 0
+        for row, col in cells:
+            mask |= 1 << (row * size + col)
+        parts.append(mask.to_bytes(mask_bytes, "little"))
+        parts.append(CAGE_SUM.pack(target_sum if isinstance(target_sum, int) else 0))
+    return b"".join(parts)
+
+
+@lru_cache(maxsize=None)
+def _cages_struct(mask_bytes, cage_count):
+    # Unpacks every (mask, sum) pair of a record in one call.
+    return struct.Struct("<" + ("%dsH" % mask_bytes) * cage_count)
+
+
+@lru_cache(maxsize=None)
+def _cell_table(size):
+    return tuple(divmod(index, size) for index in range(size * size))
+
+
+def decode_puzzle(data, offset=0):
+    # Record bytes (any buffer) at offset back to (puzzle_id, constraints, size, box).
+    size, box_rows, box_cols, cage_count, name_length = RECORD.unpack_from(data, offset)
+    offset += RECORD.size
+    puzzle_id = bytes(data[offset:offset + name_length]).decode("utf-8") if name_length else None
+    offset += name_length
+    fields = _cages_struct((size * size + 7) // 8, cage_count).unpack_from(data, offset)
+    cell_of = _cell_table(size)
+    from_bytes = int.from_bytes
+    constraints = []
+    for position in range(0, 2 * cage_count, 2):
+        mask = from_bytes(fields[position], "little")
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(cell_of[low.bit_length() - 1])
+            mask ^= low
+        constraints.append((cells, fields[position + 1]))
+    return puzzle_id, constraints, size, (box_rows, box_cols)
+
+
+class CorpusWriter:
+    # Streams puzzles into a corpus file; the index and count are written on
+    # close().
+    #
+    #   with CorpusWriter("puzzles.kspz") as writer:
+    #       writer.add(constraints, 9)
+
+    def __init__(self, path):
+        self.stream = open(path, "wb")
+        self.stream.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        self.offsets = []
+
+    def add(self, constraints, size, box=None, puzzle_id=None):
+        self.offsets.append(self.stream.tell())
+        self.stream.write(encode_puzzle(constraints, size, box, puzzle_id))
+
+    def close(self):
+        if self.stream.closed:
+            return
+        index_offset = self.stream.tell()
+        self.stream.write(struct.pack("<%dQ" % len(self.offsets), *self.offsets))
+        self.stream.seek(0)
+        self.stream.write(HEADER.pack(MAGIC, VERSION, 0, len(self.offsets), index_offset))
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def write_corpus(path, puzzles):
+    # Writes (puzzle_id, constraints, size, box) tuples; returns how many.
+    with CorpusWriter(path) as writer:
+        for puzzle_id, constraints, size, box in puzzles:
+            writer.add(constraints, size, box, puzzle_id)
+        return len(writer.offsets)
+
+
+class CorpusReader:
+    # Random access and iteration over a memory-mapped corpus file.
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._view = None
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.close()
+            raise CorpusError("%s is empty" % path)
+        self._view = memoryview(self._map)
+        if len(self._view) < HEADER.size:
+            self.close()
+            raise CorpusError("%s is not a puzzle corpus" % path)
+        magic, version, _, count, index_offset = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise CorpusError("%s is not a version %d puzzle corpus" % (path, VERSION))
+        if index_offset < HEADER.size or index_offset + INDEX_ENTRY.size * count > len(self._view):
+            self.close()
+            raise CorpusError("%s is truncated" % path)
+        self.count = count
+        self._index_offset = index_offset
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError("puzzle %d out of range" % number)
+        return self._decode(number)
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self._decode(number)
+
+    def _decode(self, number):
+        # Puzzle 'number', read through the little-endian index.
+        offset, = INDEX_ENTRY.unpack_from(self._view, self._index_offset + INDEX_ENTRY.size * number)
+        try:
+            return decode_puzzle(self._view, offset)
+        except (struct.error, UnicodeDecodeError):
+            raise CorpusError("%s: puzzle %d is damaged" % (self.path, number)) from None
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def save_puzzle(path, constraints, size, box=None, puzzle_id=None):
+    # Saves one puzzle as a corpus of one.
+    write_corpus(path, [(puzzle_id, constraints, size, box)])
+
+
+def load_puzzle(path, number=0):
+    # Loads one puzzle (the first by default) from a corpus file.
+    with CorpusReader(path) as reader:
+        return reader[number]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert puzzle corpora between JSON lines and binary.")
+    parser.add_argument("input", help="JSON-lines or binary (%s) corpus" % SUFFIX)
+    parser.add_argument("output", help="output file; binary unless it ends in .jsonl")
+    args = parser.parse_args(argv)
+
+    from batch_cli import parse_puzzle, read_lines
+
+    if is_corpus(args.input):
+        reader = CorpusReader(args.input)
+        puzzles = iter(reader)
+    else:
+        reader = open(args.input)
+        puzzles = (parse_puzzle(line) for _, line in read_lines(reader))
+    try:
+        if args.output.endswith(".jsonl"):
+            count = 0
+            with open(args.output, "w") as stream:
+                for puzzle_id, constraints, size, box in puzzles:
+                    record = {"id": puzzle_id, "size": size, "box": list(box), "constraints": constraints}
+                    stream.write(json.dumps(record) + "\n")
+                    count += 1
+        else:
+            count = write_corpus(args.output, puzzles)
+    finally:
+        reader.close()
+    print("%d puzzles" % count, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
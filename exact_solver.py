@@ -0,0 +1,198 @@
+# Exact Killer Sudoku solver.
+#
+# Backtracking over the same rules is_valid() checks (row, column, box, and
+# cage sums with no repeated digit), using candidate bitmasks, minimum
+# remaining values cell ordering, and precomputed cage combination tables to
+# prune cages that can no longer reach their sum. Bit d of a mask stands for
+# digit d.
+
+import time
+from functools import lru_cache
+
+from grid import resolve_box
+
+
+@lru_cache(maxsize=None)
+def combination_table(size):
+    # Maps (number of cells, sum) to every set of distinct digits 1..size,
+    # as a bitmask, that has that many digits and adds up to that sum.
+    table = {}
+    for bits in range(1 << size):
+        digits = [d + 1 for d in range(size) if bits >> d & 1]
+        table.setdefault((len(digits), sum(digits)), []).append(bits << 1)
+    return {key: tuple(masks) for key, masks in table.items()}
+
+
+def digits_of(mask):
+    # Lists the digits set in a candidate bitmask.
+    digits = []
+    digit = 1
+    mask >>= 1
+    while mask:
+        if mask & 1:
+            digits.append(digit)
+        mask >>= 1
+        digit += 1
+    return digits
+
+
+class ExactSolver:
+    # Holds the search state for one puzzle. solutions() yields every solution
+    # lazily; nodes counts digit placements tried so far.
+
+    def __init__(self, constraints, size=4, box=None, max_nodes=None, time_limit=None,
+                 cancel=None):
+        box_rows, box_cols = resolve_box(size, box)
+        self.size = size
+        self.full = ((1 << size) - 1) << 1
+        self.table = combination_table(size)
+        self.max_nodes = max_nodes
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.cancel = cancel
+        self.nodes = 0
+        self.aborted = False
+
+        cells = size * size
+        self.grid = [0] * cells
+        self.row_of = [index // size for index in range(cells)]
+        self.col_of = [index % size for index in range(cells)]
+        boxes_per_row = size // box_cols
+        self.box_of = [(self.row_of[index] // box_rows) * boxes_per_row + self.col_of[index] // box_cols
+                       for index in range(cells)]
+        self.row_used = [0] * size
+        self.col_used = [0] * size
+        self.box_used = [0] * size
+
+        self.cage_of = [-1] * cells
+        self.cage_left = []
+        self.cage_remaining = []
+        self.cage_used = []
+        for cage, (cage_cells, target_sum) in enumerate(constraints):
+            for row, col in cage_cells:
+                self.cage_of[row * size + col] = cage
+            self.cage_left.append(len(cage_cells))
+            self.cage_remaining.append(target_sum)
+            self.cage_used.append(0)
+        self._cage_masks = {}
+
+    def cage_mask(self, cage):
+        # Digits still usable in a cage given what is already placed in it.
+        if cage < 0:
+            return self.full
+        key = (self.cage_left[cage], self.cage_remaining[cage], self.cage_used[cage])
+        allowed = self._cage_masks.get(key)
+        if allowed is None:
+            allowed = 0
+            used = key[2]
+            for combo in self.table.get(key[:2], ()):
+                if not combo & used:
+                    allowed |= combo
+            self._cage_masks[key] = allowed
+        return allowed
+
+    def candidates(self, index):
+        # Bitmask of digits that can go in an empty cell.
+        return (self.full
+                & ~(self.row_used[self.row_of[index]]
+                    | self.col_used[self.col_of[index]]
+                    | self.box_used[self.box_of[index]])
+                & self.cage_mask(self.cage_of[index]))
+
+    def place(self, index, digit):
+        bit = 1 << digit
+        self.grid[index] = digit
+        self.row_used[self.row_of[index]] |= bit
+        self.col_used[self.col_of[index]] |= bit
+        self.box_used[self.box_of[index]] |= bit
+        cage = self.cage_of[index]
+        if cage >= 0:
+            self.cage_left[cage] -= 1
+            self.cage_remaining[cage] -= digit
+            self.cage_used[cage] |= bit
+
+    def remove(self, index, digit):
+        bit = 1 << digit
+        self.grid[index] = 0
+        self.row_used[self.row_of[index]] &= ~bit
+        self.col_used[self.col_of[index]] &= ~bit
+        self.box_used[self.box_of[index]] &= ~bit
+        cage = self.cage_of[index]
+        if cage >= 0:
+            self.cage_left[cage] += 1
+            self.cage_remaining[cage] += digit
+            self.cage_used[cage] &= ~bit
+
+    def board(self):
+        size = self.size
+        return [self.grid[row * size:(row + 1) * size] for row in range(size)]
+
+    def _out_of_budget(self):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        if self.nodes & 255 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                return True
+            if self.cancel is not None and self.cancel.is_set():
+                return True
+        return False
+
+    def _pick_cell(self):
+        # Minimum remaining values: the empty cell with the fewest candidates.
+        best_index = -1
+        best_mask = 0
+        best_count = self.size + 1
+        grid = self.grid
+        for index in range(len(grid)):
+            if grid[index]:
+                continue
+            mask = self.candidates(index)
+            count = bin(mask).count("1")
+            if count < best_count:
+                best_index, best_mask, best_count = index, mask, count
+                if count <= 1:
+                    break
+        return best_index, best_mask
+
+    def solutions(self):
+        # Yields each solution board in turn.
+        index, mask = self._pick_cell()
+        if index < 0:
+            yield self.board()
+            return
+        for digit in digits_of(mask):
+            if self._out_of_budget():
+                self.aborted = True
+                return
+            self.nodes += 1
+            self.place(index, digit)
+            yield from self.solutions()
+            self.remove(index, digit)
+            if self.aborted:
+                return
+
+
+def solve_exact(constraints, size=4, box=None, max_nodes=None, time_limit=None, stats=None,
+                cancel=None):
+    # Finds one solution. Returns (board, True), or (None, False) if there is
+    # none, the node/time budget ran out or cancel (an Event) was set.
+    # stats gets nodes and time.
+    if stats is None:
+        stats = {}
+    start = time.perf_counter()
+    solver = ExactSolver(constraints, size, box, max_nodes, time_limit, cancel)
+    solution = next(solver.solutions(), None)
+    stats["nodes"] = solver.nodes
+    stats["time"] = time.perf_counter() - start
+    stats["aborted"] = solver.aborted
+    return solution, solution is not None
+
+
+def count_solutions(constraints, limit=2, size=4, box=None, max_nodes=None, time_limit=None):
+    # Counts solutions, stopping once 'limit' have been found.
+    solver = ExactSolver(constraints, size, box, max_nodes, time_limit)
+    count = 0
+    for _ in solver.solutions():
+        count += 1
+        if count >= limit:
+            break
+    return count
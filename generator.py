@@ -0,0 +1,247 @@
+# Killer Sudoku puzzle generator.
+#
+# A puzzle is made from a random valid grid cut into connected cages of up
+# to max_cage cells with no repeated digit; the cage sums come from the grid.
+# Uniqueness is checked with the exact solver, stopping at the second
+# solution. When a second solution exists, the cage holding a cell where the
+# two differ is split so that cell becomes a single-cell cage, which rules
+# that solution out, and the check repeats until the solution is unique. A
+# check that runs out of search nodes splits several of the largest cages
+# the same way, so large boards (16x16) end up with smaller cages instead of
+# searching on indefinitely.
+#
+# Puzzles are generated on a process pool and streamed as corpus records in
+# order; record n depends only on (seed, n), not on the number of workers.
+#
+#   python generator.py -n 1000 --size 9 --workers 4 -o puzzles.jsonl
+
+import argparse
+import json
+import random
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from corpus_format import SUFFIX, write_corpus
+from exact_solver import ExactSolver
+from grid import resolve_box
+from solver import GRID_SIZE
+
+# Search nodes per cell needed to prove uniqueness, as grade upper bounds
+GRADES = (("easy", 2), ("medium", 10), ("hard", 100))
+MAX_NODES = 200000
+
+NEIGHBORS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+def random_solution(size, box, rng):
+    # A random valid Sudoku grid: the first exact solution with its digits,
+    # bands, stacks, and rows/columns within them shuffled.
+    box_rows, box_cols = resolve_box(size, box)
+    grid = next(ExactSolver([], size, (box_rows, box_cols)).solutions())
+    digits = list(range(1, size + 1))
+    rng.shuffle(digits)
+
+    def shuffled_lines(block):
+        groups = [list(range(start, start + block)) for start in range(0, size, block)]
+        rng.shuffle(groups)
+        for group in groups:
+            rng.shuffle(group)
+        return [line for group in groups for line in group]
+
+    rows = shuffled_lines(box_rows)
+    cols = shuffled_lines(box_cols)
+    return [[digits[grid[row][col] - 1] for col in cols] for row in rows]
+
+
+def random_cages(solution, rng, max_cage=4):
+    # Splits the grid into connected cages of up to max_cage cells with no
+    # repeated digit, and derives their sums from the solution.
+    size = len(solution)
+    left = {(row, col) for row in range(size) for col in range(size)}
+    constraints = []
+    while left:
+        cell = min(left)
+        left.remove(cell)
+        cage = [cell]
+        digits = {solution[cell[0]][cell[1]]}
+        target = rng.randint(1, max_cage)
+        while len(cage) < target:
+            neighbors = [(row + dr, col + dc) for row, col in cage
+                         for dr, dc in NEIGHBORS
+                         if (row + dr, col + dc) in left and solution[row + dr][col + dc] not in digits]
+            if not neighbors:
+                break
+            cell = rng.choice(neighbors)
+            left.remove(cell)
+            cage.append(cell)
+            digits.add(solution[cell[0]][cell[1]])
+        constraints.append((sorted(cage), sum(solution[row][col] for row, col in cage)))
+    return constraints
+
+
+def connected_parts(cells):
+    # Splits a set of cells into its orthogonally connected parts.
+    left = set(cells)
+    parts = []
+    while left:
+        stack = [min(left)]
+        left.remove(stack[0])
+        part = []
+        while stack:
+            row, col = stack.pop()
+            part.append((row, col))
+            for dr, dc in NEIGHBORS:
+                cell = (row + dr, col + dc)
+                if cell in left:
+                    left.remove(cell)
+                    stack.append(cell)
+        parts.append(sorted(part))
+    return parts
+
+
+def split_cage(constraints, solution, cell):
+    # Makes cell a single-cell cage; the rest of its cage becomes one cage per
+    # connected part. Sums are rederived from the solution.
+    for number, (cells, _) in enumerate(constraints):
+        if cell in cells:
+            break
+    else:
+        raise ValueError("cell %r is in no cage" % (cell,))
+    rest = [other for other in cells if other != cell]
+    parts = [[cell]] + connected_parts(rest)
+    new_cages = [(part, sum(solution[row][col] for row, col in part)) for part in parts]
+    return constraints[:number] + new_cages + constraints[number + 1:]
+
+
+def first_solutions(constraints, size, box, limit=2, max_nodes=MAX_NODES):
+    # Up to 'limit' solutions, the search nodes used, and whether the search
+    # ran out of nodes before it could tell.
+    solver = ExactSolver(constraints, size, box, max_nodes)
+    found = []
+    for solution in solver.solutions():
+        found.append(solution)
+        if len(found) >= limit:
+            break
+    return found, solver.nodes, solver.aborted
+
+
+def grade(nodes, size):
+    per_cell = nodes / (size * size)
+    for name, limit in GRADES:
+        if per_cell <= limit:
+            return name
+    return "expert"
+
+
+def generate_puzzle(size=GRID_SIZE, box=None, rng=random, max_cage=4, max_nodes=MAX_NODES):
+    # Returns (constraints, solution, nodes) for a puzzle with exactly one
+    # solution; nodes is the size of the final uniqueness search. When a
+    # check runs out of nodes the puzzle is too loose to prove unique, so
+    # 'size' of its largest cages are split and the check runs again; the
+    # grid is never thrown away, and the loop ends at the latest when every
+    # cage is a single cell.
+    box = resolve_box(size, box)
+    solution = random_solution(size, box, rng)
+    constraints = random_cages(solution, rng, max_cage)
+    while True:
+        found, nodes, aborted = first_solutions(constraints, size, box, 2, max_nodes)
+        if not aborted and len(found) == 1:
+            return constraints, solution, nodes
+        if aborted:
+            candidates = None
+            splits = size
+        else:
+            other = found[1] if found[0] == solution else found[0]
+            candidates = [(row, col) for row in range(size) for col in range(size)
+                          if other[row][col] != solution[row][col]]
+            splits = 1
+        for _ in range(splits):
+            # Split the largest cage holding a candidate cell (any cell after
+            # an aborted check); it keeps the most of its shape
+            sizes = {cell: len(cells) for cells, _ in constraints for cell in cells}
+            largest = max(sizes[cell] for cell in candidates or sizes)
+            if largest == 1:
+                break
+            cell = rng.choice([cell for cell in candidates or sizes if sizes[cell] == largest])
+            constraints = split_cage(constraints, solution, cell)
+
+
+def puzzle_record(number, options):
+    # Generates puzzle 'number' of a corpus as a JSON-ready record.
+    size = options["size"]
+    rng = random.Random("%s:%d" % (options["seed"], number))
+    constraints, solution, nodes = generate_puzzle(size, options["box"], rng, options["max_cage"],
+                                                   options["max_nodes"])
+    record = {"id": "%dx%d-%05d" % (size, size, number), "size": size,
+              "constraints": constraints, "solution": solution,
+              "grade": grade(nodes, size), "nodes": nodes}
+    if options["box"]:
+        record["box"] = list(options["box"])
+    return record
+
+
+def generate_puzzles(count, size=GRID_SIZE, box=None, seed=None, max_cage=4, max_nodes=MAX_NODES,
+                     workers=1, window=None):
+    # Yields 'count' puzzle records in order, generated on 'workers'
+    # processes with at most 'window' puzzles in flight or buffered.
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    options = {"size": size, "box": box, "seed": seed, "max_cage": max_cage, "max_nodes": max_nodes}
+    if workers <= 1:
+        for number in range(count):
+            yield puzzle_record(number, options)
+        return
+
+    if window is None:
+        window = workers * 4
+    submitted = 0
+    next_to_yield = 0
+    finished = {}
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while next_to_yield < count:
+            while submitted < count and len(pending) + len(finished) < window:
+                pending[executor.submit(puzzle_record, submitted, options)] = submitted
+                submitted += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            while next_to_yield in finished:
+                yield finished.pop(next_to_yield)
+                next_to_yield += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Killer Sudoku puzzles with unique solutions.")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("-o", "--output", default="-", help="puzzle file (binary if it ends in %s), or - for stdout" % SUFFIX)
+    parser.add_argument("--size", type=int, default=GRID_SIZE)
+    parser.add_argument("--box", type=int, nargs=2, metavar=("ROWS", "COLS"))
+    parser.add_argument("--max-cage", type=int, default=4, help="largest cage, in cells")
+    parser.add_argument("--max-nodes", type=int, default=MAX_NODES,
+                        help="search nodes allowed for each uniqueness check")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    box = tuple(args.box) if args.box else None
+    resolve_box(args.size, box)
+    records = generate_puzzles(args.count, args.size, box, args.seed, args.max_cage, args.max_nodes,
+                               args.workers)
+    if args.output.endswith(SUFFIX):
+        # The binary format keeps the cages only, not the solution or grade
+        write_corpus(args.output, ((record["id"], record["constraints"], record["size"], box)
+                                   for record in records))
+        return
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for record in records:
+            sink.write(json.dumps(record) + "\n")
+            sink.flush()
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+
+
+if __name__ == "__main__":
+    main()
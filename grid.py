@@ -0,0 +1,28 @@
+# Board geometry shared by the solvers: grid size and box shape.
+
+
+def box_shape(size):
+    # Returns (box_rows, box_cols) for a size x size grid, picking the most
+    # square split with box_rows <= box_cols: 4 -> 2x2, 6 -> 2x3, 9 -> 3x3,
+    # 16 -> 4x4.
+    box_rows = int(size ** 0.5)
+    while size % box_rows:
+        box_rows -= 1
+    return box_rows, size // box_rows
+
+
+def resolve_box(size, box=None):
+    # Returns the given box shape after checking it tiles the grid, or the
+    # default box_shape() for the size.
+    if box is None:
+        return box_shape(size)
+    box_rows, box_cols = box
+    if box_rows * box_cols != size:
+        raise ValueError("A %dx%d box does not tile a %dx%d grid" % (box_rows, box_cols, size, size))
+    return box_rows, box_cols
+
+
+def box_origins(size, box):
+    # Lists the top-left cell of every box, row by row.
+    box_rows, box_cols = box
+    return [(row, col) for row in range(0, size, box_rows) for col in range(0, size, box_cols)]
@@ -0,0 +1,183 @@
+# Solver instrumentation.
+#
+# Solvers always keep cheap integer counters in their stats dict (proposals,
+# acceptances, uphill acceptances, fitness calls). Passing an Instrumentation
+# to solve() additionally times each phase (neighbor generation, scoring,
+# acceptance, rendering) and sends per-step events to observers:
+#
+#   "step"    after every temperature step: step, temperature, score,
+#             best_score, the counters so far and elapsed seconds
+#   "finish"  once, with the final stats and phase timings
+#
+# Observers only need an on_event(event, fields) method. With no
+# Instrumentation nothing is timed and no events are built.
+
+import cProfile
+import csv
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+PHASES = ("neighbor", "scoring", "acceptance", "rendering")
+
+
+class Instrumentation:
+    # Collects phase timings and fans events out to observers.
+
+    def __init__(self, observers=None, timing=True):
+        self.observers = list(observers) if observers else []
+        self.timing = timing
+        self.timings = defaultdict(float)
+
+    def add_time(self, phase, seconds):
+        self.timings[phase] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        # Times a block of code as the given phase.
+        if not self.timing:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def emit(self, event, **fields):
+        for observer in self.observers:
+            observer.on_event(event, fields)
+
+    def finish(self, stats):
+        # Copies the timings into stats and sends the "finish" event.
+        if self.timing:
+            stats["timings"] = dict(self.timings)
+        self.emit("finish", **stats)
+
+
+class NullObserver:
+    # Ignores everything; the default.
+
+    def on_event(self, event, fields):
+        pass
+
+
+class LoggingObserver:
+    # Logs every event as one line on a logger.
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger if logger is not None else logging.getLogger("solver")
+        self.level = level
+
+    def on_event(self, event, fields):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "%s %s", event,
+                            " ".join("%s=%s" % (key, _format(value)) for key, value in sorted(fields.items())))
+
+
+class HistogramObserver:
+    # Keeps every numeric field of every event in memory, for histograms and
+    # summaries after the run.
+
+    def __init__(self):
+        self.values = defaultdict(lambda: defaultdict(list))
+
+    def on_event(self, event, fields):
+        for key, value in fields.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.values[event][key].append(value)
+
+    def histogram(self, event, field, bins=10):
+        # Returns [(low, high, count), ...] over the recorded values.
+        values = self.values[event][field]
+        if not values:
+            return []
+        low, high = min(values), max(values)
+        width = (high - low) / bins or 1
+        counts = Counter(min(bins - 1, int((value - low) / width)) for value in values)
+        return [(low + index * width, low + (index + 1) * width, counts[index]) for index in range(bins)]
+
+
+class CSVTraceObserver:
+    # Writes one CSV row per "step" event to a path or open stream.
+
+    def __init__(self, target, event="step"):
+        self.event = event
+        self.owns_stream = isinstance(target, str)
+        self.stream = open(target, "w", newline="") if self.owns_stream else target
+        self.writer = None
+
+    def on_event(self, event, fields):
+        if event == "finish" and self.owns_stream:
+            self.stream.close()
+        if event != self.event:
+            return
+        row = {key: value for key, value in fields.items() if isinstance(value, (int, float, str))}
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.stream, fieldnames=sorted(row), extrasaction="ignore")
+            self.writer.writeheader()
+        self.writer.writerow(row)
+
+
+def _format(value):
+    if isinstance(value, float):
+        return "%.6g" % value
+    return value
+
+
+def profile_solve(function, *args, sort="cumulative", limit=25, stream=None, **kwargs):
+    # Runs function(*args, **kwargs) under cProfile, prints the top 'limit'
+    # entries to stream (default stderr) and returns the function's result.
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    stats = pstats.Stats(profiler, stream=stream if stream is not None else sys.stderr)
+    stats.sort_stats(sort).print_stats(limit)
+    return result
+
+
+class SamplingProfiler:
+    # Low-overhead sampling profiler for the thread that enters it: a
+    # background thread records which function that thread is in every
+    # 'interval' seconds.
+    #
+    #   with SamplingProfiler() as sampler:
+    #       solve(constraints)
+    #   print(sampler.report())
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                code = frame.f_code
+                self.samples["%s:%s" % (code.co_filename.rsplit("/", 1)[-1], code.co_name)] += 1
+
+    def report(self, limit=15):
+        total = sum(self.samples.values()) or 1
+        out = io.StringIO()
+        for name, count in self.samples.most_common(limit):
+            out.write("%6.1f%%  %s\n" % (100.0 * count / total, name))
+        return out.getvalue()
@@ -0,0 +1,187 @@
+# Min-conflicts local search.
+#
+# Like simulated annealing this starts from a board whose boxes each hold
+# every digit once and only swaps cells within a box, but instead of drawing
+# both cells at random it steers every move by conflicts. A cell's conflict
+# count is the number of other cells in its row and its column holding the
+# same digit, plus one if its cage sum is off; all of it is read in O(1) from
+# the board.Board counts and the SwapScorer cage sums. Each move picks a box,
+# takes its most conflicted cell and swaps it with the partner in the box
+# that lowers the score most. With probability 'noise' the partner is random
+# instead (a random walk step that escapes plateaus), the pair just swapped
+# is never swapped straight back, and the board restarts from a fresh random
+# one after 'restart_after' moves without improving on its best score.
+#
+#   solution, solved = min_conflicts(board, constraints, box=(3, 3), rng=random.Random(1))
+
+import random
+import time
+
+from board import Board, box_cell_table
+from grid import resolve_box
+
+# Defaults used by solve(engine="min-conflicts")
+MAX_MOVES = 20000
+NOISE = 0.05
+RESTART_AFTER = 5000
+# on_step is called every this many moves
+REPORT_EVERY = 100
+
+
+def cell_conflicts(board, constraints):
+    # Conflict count of every cell of a board given as rows of digits, as
+    # used by min_conflicts(); the GUI shows it as a heatmap.
+    size = len(board)
+    rows = [{} for _ in range(size)]
+    cols = [{} for _ in range(size)]
+    for i, row in enumerate(board):
+        for j, value in enumerate(row):
+            rows[i][value] = rows[i].get(value, 0) + 1
+            cols[j][value] = cols[j].get(value, 0) + 1
+    conflicts = [[rows[i][value] + cols[j][value] - 2 for j, value in enumerate(row)]
+                 for i, row in enumerate(board)]
+    for cells, target_sum in constraints:
+        if sum(board[row][col] for row, col in cells) != target_sum:
+            for row, col in cells:
+                conflicts[row][col] += 1
+    return conflicts
+
+
+def min_conflicts(board, constraints, max_moves=MAX_MOVES, noise=NOISE, restart_after=RESTART_AFTER,
+                  on_step=None, rng=random, stats=None, box=None, instrument=None, time_limit=None):
+    # Solves the puzzle by min-conflicts search from board (rows of digits,
+    # every box a permutation, left untouched). Returns (rows, solved), with
+    # the best board seen if no solution turned up within max_moves moves or
+    # time_limit seconds. on_step(board, score, noise) is called every
+    # REPORT_EVERY moves. stats gets the annealing counters (a proposal is a
+    # move, a fitness call one swap evaluation) plus random walks and restarts.
+    from solver import SwapScorer, generate_board
+
+    if stats is None:
+        stats = {}
+    for counter in ("proposals", "acceptances", "uphill_acceptances", "fitness_calls", "steps",
+                    "walks", "restarts"):
+        stats.setdefault(counter, 0)
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    deadline = None if time_limit is None else started + time_limit
+
+    size = len(board)
+    box = resolve_box(size, box)
+    grid = Board.from_rows(board, box)
+    scorer = SwapScorer(grid, constraints)
+    stats["fitness_calls"] += 1
+    if scorer.score == 0:
+        return grid.to_rows(), True
+
+    boxes = box_cell_table(size, box)
+    box_count = len(boxes)
+    random_ = rng.random
+    stride = size + 1
+    best = grid.snapshot()
+    best_score = scorer.score
+    moves = uphill = evaluations = walks = 0
+    run_best = best_score
+    last_pair = None
+    since_best = 0
+
+    while moves < max_moves:
+        # Local names are rebound after a restart replaces the board
+        cells = grid.cells
+        row_of, col_of = grid.row_of, grid.col_of
+        row_counts, col_counts = grid.row_counts, grid.col_counts
+        cage_of, cage_sums, cage_targets = scorer.cage_of, scorer.cage_sums, scorer.cage_targets
+        delta_of = scorer.delta
+
+        while moves < max_moves and since_best < restart_after:
+            # Most conflicted cell of a random box; conflict-free boxes cost no evaluations
+            box_cells = boxes[int(random_() * box_count)]
+            worst = 0
+            picked = []
+            for index in box_cells:
+                digit = cells[index]
+                conflicts = row_counts[row_of[index] * stride + digit] + col_counts[col_of[index] * stride + digit] - 2
+                cage = cage_of[index]
+                if cage >= 0 and cage_sums[cage] != cage_targets[cage]:
+                    conflicts += 1
+                if conflicts > worst:
+                    worst = conflicts
+                    picked = [index]
+                elif conflicts == worst and worst:
+                    picked.append(index)
+            if not worst:
+                continue
+            cell1 = picked[int(random_() * len(picked))]
+
+            if random_() < noise:
+                cell2 = box_cells[int(random_() * size)]
+                if cell2 == cell1:
+                    continue
+                delta = delta_of(cell1, cell2)
+                evaluations += 1
+                walks += 1
+            else:
+                delta = None
+                partners = []
+                for index in box_cells:
+                    if index == cell1 or (last_pair is not None and index in last_pair and cell1 in last_pair):
+                        continue
+                    change = delta_of(cell1, index)
+                    if delta is None or change < delta:
+                        delta = change
+                        partners = [index]
+                    elif change == delta:
+                        partners.append(index)
+                evaluations += len(box_cells) - 1
+                if not partners:
+                    continue
+                cell2 = partners[int(random_() * len(partners))]
+
+            scorer.swap(cell1, cell2, delta)
+            last_pair = (cell1, cell2)
+            moves += 1
+            since_best += 1
+            if delta > 0:
+                uphill += 1
+            score = scorer.score
+            if score < run_best:
+                run_best = score
+                since_best = 0
+                if score < best_score:
+                    best_score = score
+                    best = grid.snapshot()
+                    if score == 0:
+                        break
+            if moves % REPORT_EVERY == 0:
+                stats["steps"] += 1
+                if instrument is not None:
+                    instrument.emit("step", step=stats["steps"], temperature=noise, score=score,
+                                    best_score=best_score, proposals=stats["proposals"] + moves,
+                                    acceptances=stats["acceptances"] + moves,
+                                    uphill_acceptances=stats["uphill_acceptances"] + uphill,
+                                    fitness_calls=stats["fitness_calls"] + evaluations,
+                                    elapsed=perf_counter() - started)
+                if on_step is not None:
+                    on_step(grid.to_rows(), score, noise)
+                if deadline is not None and perf_counter() > deadline:
+                    break
+
+        if best_score == 0 or moves >= max_moves or (deadline is not None and perf_counter() > deadline):
+            break
+        # Stuck: start over from a fresh board, keeping the best one seen
+        grid = Board.from_rows(generate_board(size, box, rng), box)
+        scorer = SwapScorer(grid, constraints)
+        evaluations += 1
+        run_best = scorer.score
+        last_pair = None
+        since_best = 0
+        stats["restarts"] += 1
+
+    stats["proposals"] += moves
+    stats["acceptances"] += moves
+    stats["uphill_acceptances"] += uphill
+    stats["fitness_calls"] += evaluations
+    stats["walks"] += walks
+    if best_score == 0:
+        return grid.to_rows(), True
+    return Board(size, box, best).to_rows(), False
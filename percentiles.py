@@ -0,0 +1,12 @@
+# Percentiles shared by the benchmark harness and the solver service.
+
+import math
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a list: the smallest value with at least
+    # 'fraction' of the values at or below it; None when it is empty.
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
@@ -0,0 +1,140 @@
+# Parallel restart portfolio.
+#
+# Runs independent annealing restarts, each with its own seed and optionally
+# its own schedule, across a process pool. The first restart to reach
+# fitness 0 wins; the others are told to stop through a shared event and any
+# restarts not yet started are cancelled. A wall-clock deadline bounds the
+# whole run.
+
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from solver import (
+    GRID_SIZE, SolveCancelled, SolveResult, a_cooling_rate, a_iterations, a_temperature, solve,
+)
+
+# How often, in seconds, a waiting portfolio checks its cancel event
+CANCEL_POLL = 0.05
+
+# Set in every worker by _init_worker()
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _run_restart(constraints, size, box, seed, config, deadline):
+    # Runs one restart; returns its SolveResult, or None if it was told to stop.
+    def check_stop(board, score, temperature):
+        if _stop_event.is_set() or (deadline is not None and time.time() > deadline):
+            raise SolveCancelled()
+
+    try:
+        return solve(constraints, config.get("temperature"), config.get("cooling_rate"),
+                     config.get("iterations"), on_step=check_stop, seed=seed,
+                     engine=config.get("engine", "annealing"), size=size, box=box,
+                     chains=config.get("chains", 256), schedule=config.get("schedule"),
+                     tabu=config.get("tabu", 0))
+    except SolveCancelled:
+        return None
+
+
+def default_configs():
+    # The configured schedule plus a hotter/slower and a cooler/faster variant.
+    return [
+        {"temperature": a_temperature, "cooling_rate": a_cooling_rate, "iterations": a_iterations},
+        {"temperature": a_temperature * 2, "cooling_rate": 0.97, "iterations": a_iterations},
+        {"temperature": a_temperature / 2, "cooling_rate": 0.9, "iterations": a_iterations},
+    ]
+
+
+def solve_portfolio(constraints, workers=None, restarts=None, configs=None, deadline=None,
+                    seed=None, size=GRID_SIZE, box=None, cancel=None):
+    # Solves with restarts spread over 'workers' processes (default: CPU count).
+    # restarts caps how many are launched (default: 4 per worker, or unlimited
+    # until the deadline when one is given). configs is a list of schedule
+    # dicts (temperature, cooling_rate, iterations, engine, chains, schedule,
+    # tabu) cycled over the restarts. deadline is in seconds. Setting the
+    # optional cancel Event stops every restart and raises SolveCancelled.
+    # Returns a SolveResult whose stats name the winning seed and config.
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if configs is None:
+        configs = default_configs()
+    if restarts is None and deadline is None:
+        restarts = 4 * workers
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    end_time = None if deadline is None else time.time() + deadline
+
+    start = time.perf_counter()
+    stats = {"engine": "portfolio", "workers": workers, "restarts": 0, "proposals": 0}
+    best = None
+    stop_event = multiprocessing.Event()
+    launches = itertools.count()
+    config_cycle = itertools.cycle(configs)
+    pending = {}
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(stop_event,))
+
+    def launch():
+        index = next(launches)
+        if restarts is not None and index >= restarts:
+            return False
+        config = next(config_cycle)
+        future = executor.submit(_run_restart, constraints, size, box, seed + index, config, end_time)
+        pending[future] = (seed + index, config)
+        stats["restarts"] += 1
+        return True
+
+    try:
+        for _ in range(workers):
+            if not launch():
+                break
+
+        while pending:
+            timeout = None if end_time is None else max(0.0, end_time - time.time())
+            if cancel is not None:
+                timeout = CANCEL_POLL if timeout is None else min(timeout, CANCEL_POLL)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                raise SolveCancelled()
+            if not done:
+                if end_time is not None and time.time() >= end_time:
+                    stats["timed_out"] = True
+                    break
+                continue
+            for future in done:
+                restart_seed, config = pending.pop(future)
+                result = future.result()
+                if result is None:
+                    continue
+                stats["proposals"] += result.stats.get("proposals", 0)
+                if best is None or result.solved:
+                    best = result
+                if result.solved:
+                    stats["seed"] = restart_seed
+                    stats["config"] = config
+                    break
+            if best is not None and best.solved:
+                break
+            if end_time is not None and time.time() >= end_time:
+                stats["timed_out"] = True
+                break
+            while len(pending) < workers and launch():
+                pass
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    stats["time"] = time.perf_counter() - start
+    if best is None:
+        return SolveResult([[0] * size for _ in range(size)], False, stats)
+    return SolveResult(best.solution, best.solved, stats)
@@ -0,0 +1,102 @@
+# Compiled puzzle structures.
+#
+# A Puzzle is built once from the (cells, target_sum) constraints (or the
+# GUI's all_selected_groups) and precomputes everything the rule checks look
+# up over and over: the cage of every cell, cage sizes and sums, the row,
+# column and box peers of every cell and a bitmap of the cells covered by a
+# cage. Cells are also addressed by flat index row * size + col.
+#
+# A Puzzle iterates like the constraint list it was built from, so it can be
+# passed anywhere constraints are expected.
+
+from functools import lru_cache
+
+from grid import resolve_box
+
+
+@lru_cache(maxsize=None)
+def peer_tables(size, box):
+    # Row, column, box and combined peers of every cell (excluding the cell
+    # itself), shared by every puzzle of the same geometry.
+    box_rows, box_cols = box
+    row_peers = []
+    col_peers = []
+    box_peers = []
+    for index in range(size * size):
+        row, col = divmod(index, size)
+        start_row = (row // box_rows) * box_rows
+        start_col = (col // box_cols) * box_cols
+        row_peers.append(tuple((row, c) for c in range(size) if c != col))
+        col_peers.append(tuple((r, col) for r in range(size) if r != row))
+        box_peers.append(tuple((r, c)
+                               for r in range(start_row, start_row + box_rows)
+                               for c in range(start_col, start_col + box_cols)
+                               if (r, c) != (row, col)))
+    peers = tuple(tuple(sorted(set(row_peers[index] + col_peers[index] + box_peers[index])))
+                  for index in range(size * size))
+    return tuple(row_peers), tuple(col_peers), tuple(box_peers), peers
+
+
+class Puzzle:
+
+    def __init__(self, constraints, size, box=None):
+        self.size = size
+        self.box = resolve_box(size, box)
+        cells_count = size * size
+
+        self.cages = []
+        self.cage_cells = []
+        self.cage_sums = []
+        self.cage_sizes = []
+        self.cage_of = [-1] * cells_count
+        self.coverage = 0
+        for cage, (cells, target_sum) in enumerate(constraints):
+            cells = [tuple(cell) for cell in cells]
+            self.cages.append((cells, target_sum))
+            self.cage_cells.append(tuple(cells))
+            self.cage_sums.append(target_sum)
+            self.cage_sizes.append(len(cells))
+            for row, col in cells:
+                index = row * size + col
+                self.cage_of[index] = cage
+                self.coverage |= 1 << index
+
+        self.row_peers, self.col_peers, self.box_peers, self.peers = peer_tables(size, self.box)
+        self.full = (1 << cells_count) - 1
+
+    @classmethod
+    def from_groups(cls, all_selected_groups, size, box=None):
+        # Builds a puzzle from GUI groups ([cell, ..., sum]); groups whose sum
+        # has not been entered yet get a target_sum of None.
+        constraints = []
+        for group in all_selected_groups:
+            cells = [cell for cell in group if isinstance(cell, tuple)]
+            target_sum = group[-1] if group and not isinstance(group[-1], tuple) else None
+            constraints.append((cells, target_sum))
+        return cls(constraints, size, box)
+
+    def __iter__(self):
+        return iter(self.cages)
+
+    def __len__(self):
+        return len(self.cages)
+
+    def __getitem__(self, cage):
+        return self.cages[cage]
+
+    def cage_at(self, row, col):
+        # Index of the cage holding (row, col), or -1.
+        return self.cage_of[row * self.size + col]
+
+    def covers(self, row, col):
+        return self.coverage >> (row * self.size + col) & 1 == 1
+
+    def all_cells_included(self):
+        return self.coverage == self.full
+
+    def all_groups_have_int(self):
+        return all(isinstance(target_sum, int) for target_sum in self.cage_sums)
+
+    def is_complete(self):
+        # Every cell is in a cage and every cage has its sum.
+        return self.all_cells_included() and self.all_groups_have_int()
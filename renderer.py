@@ -0,0 +1,155 @@
+# Cached grid rendering for the pygame GUI.
+#
+# The empty grid (cell lines and box borders) is rendered once per board
+# geometry, and the cage outlines and sums are layered on top of it only
+# when the cages change. Digits and sums come from a glyph cache, and
+# update_cells() redraws just the cells whose digit changed since the last
+# frame, pushing only those rectangles to the screen. While a solve is in
+# progress the cells can also be tinted by their conflict count (a heatmap).
+#
+# Imported by ai_act2.init_display() after pygame, never by the solver.
+
+import pygame
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRAY = (200, 200, 200)
+HEAT = (255, 0, 0)
+# Conflict count at which a cell's tint is strongest
+HEAT_LEVELS = 4
+
+
+class GridRenderer:
+
+    def __init__(self, window, size, box, cell_size, font_size):
+        self.window = window
+        self.size = size
+        self.box_rows, self.box_cols = box
+        self.cell_size = cell_size
+        self.font = pygame.font.Font(None, font_size)
+        self.glyphs = {}
+        self.grid_surface = self._render_grid()
+        self.blank_surface = self._blank()
+        self.background = None
+        self._background_key = None
+        # Digit and heat level currently on screen for every cell that shows one
+        self.shown = {}
+        self.heat_shown = {}
+        self.heat_tints = [None] + [self._tint(level) for level in range(1, HEAT_LEVELS + 1)]
+
+    def glyph(self, text):
+        # Rendered text surface, cached by its string.
+        surface = self.glyphs.get(text)
+        if surface is None:
+            surface = self.font.render(text, True, BLACK)
+            self.glyphs[text] = surface
+        return surface
+
+    def cell_rect(self, row, col):
+        return pygame.Rect(col * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size)
+
+    def _blank(self):
+        surface = pygame.Surface(self.window.get_size())
+        surface.fill(WHITE)
+        return surface
+
+    def _tint(self, level):
+        surface = pygame.Surface((self.cell_size - 2, self.cell_size - 2), pygame.SRCALPHA)
+        surface.fill(HEAT + (40 + 160 * level // HEAT_LEVELS,))
+        return surface
+
+    def _render_grid(self):
+        surface = self._blank()
+        for i in range(self.size):
+            for j in range(self.size):
+                pygame.draw.rect(surface, BLACK, self.cell_rect(i, j), 1)
+        return surface
+
+    def _draw_box_borders(self, surface):
+        # Drawn over the cage outlines so they stay visible inside cages
+        cell = self.cell_size
+        width, height = surface.get_size()
+        for i in range(self.box_rows, self.size, self.box_rows):
+            pygame.draw.line(surface, GRAY, (0, i * cell), (width, i * cell), 3)
+        for j in range(self.box_cols, self.size, self.box_cols):
+            pygame.draw.line(surface, GRAY, (j * cell, 0), (j * cell, height), 3)
+
+    def set_cages(self, groups, draw=True):
+        # Rebuilds the background (grid, cage outlines and sums) if the cages changed.
+        key = (draw, tuple(tuple(group) for group in groups))
+        if key == self._background_key:
+            return False
+        self._background_key = key
+        cell = self.cell_size
+        surface = (self.grid_surface if draw else self.blank_surface).copy()
+
+        for group in groups:
+            cells = set(group[:-1])
+            for i, j in group[:-1]:
+                if i < self.size - 1 and (i + 1, j) in cells:
+                    pygame.draw.line(surface, WHITE, (j * cell + 1, (i + 1) * cell),
+                                     ((j + 1) * cell - 2, (i + 1) * cell), 3)
+                if j < self.size - 1 and (i, j + 1) in cells:
+                    pygame.draw.line(surface, WHITE, ((j + 1) * cell, i * cell + 1),
+                                     ((j + 1) * cell, (i + 1) * cell - 2), 3)
+
+            first_cell = group[0]
+            if not isinstance(group[-1], tuple) and group[-1] != 0:
+                text_surface = self.glyph(str(group[-1]))
+                text_rect = text_surface.get_rect(topleft=(first_cell[1] * cell + 2, first_cell[0] * cell + 2))
+                surface.blit(text_surface, text_rect)
+
+                line_length = 3
+                pygame.draw.line(surface, BLACK, (text_rect.right + 3, text_rect.top - 1),
+                                 (text_rect.right + 3, text_rect.bottom + line_length), 3)
+                pygame.draw.line(surface, BLACK, (text_rect.left - 1, text_rect.bottom + 2),
+                                 (text_rect.right + line_length, text_rect.bottom + 2), 3)
+
+        if draw:
+            self._draw_box_borders(surface)
+        self.background = surface
+        return True
+
+    def _draw_digit(self, row, col, value):
+        text_surface = self.glyph(str(value))
+        center = (col * self.cell_size + self.cell_size // 2, row * self.cell_size + self.cell_size // 2)
+        self.window.blit(text_surface, text_surface.get_rect(center=center))
+
+    def draw(self, groups, solution=None, draw=True):
+        # Full redraw of the window: background plus every digit of solution.
+        self.set_cages(groups, draw)
+        self.window.blit(self.background, (0, 0))
+        self.shown = {}
+        self.heat_shown = {}
+        if solution:
+            for i, row in enumerate(solution):
+                for j, value in enumerate(row):
+                    if isinstance(value, int):
+                        self._draw_digit(i, j, value)
+                        self.shown[(i, j)] = value
+
+    def update_cells(self, groups, board, heat=None):
+        # Redraws only cells whose digit or heat differs from what is on
+        # screen and updates just those rectangles. heat, rows of conflict
+        # counts like board, tints each cell. Returns the dirty rectangles.
+        if self.set_cages(groups):
+            self.draw(groups, board)
+            pygame.display.flip()
+            return [self.window.get_rect()]
+        dirty = []
+        for i, row in enumerate(board):
+            for j, value in enumerate(row):
+                level = min(heat[i][j], HEAT_LEVELS) if heat else 0
+                if self.shown.get((i, j)) == value and self.heat_shown.get((i, j), 0) == level:
+                    continue
+                rect = self.cell_rect(i, j)
+                self.window.blit(self.background, rect, rect)
+                if level:
+                    self.window.blit(self.heat_tints[level], rect.inflate(-2, -2))
+                self._draw_digit(i, j, value)
+                self.shown[(i, j)] = value
+                self.heat_shown[(i, j)] = level
+                dirty.append(rect)
+        if dirty:
+            pygame.display.update(dirty)
+        return dirty
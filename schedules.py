@@ -0,0 +1,107 @@
+# Annealing schedules.
+#
+# A schedule decides the temperature and the number of proposals of every
+# temperature step. The annealing loops call
+# start(temperature, cooling_rate, iterations) once, then after every step
+# next_step(proposals, acceptances, best_score) with that step's counts; both
+# return (temperature, iterations) for the next step, or None to stop.
+#
+#   "geometric"        temperature *= cooling_rate, one iteration fewer per
+#                      step; the original schedule and the default
+#   "adaptive"         cools faster while many proposals are accepted and
+#                      slower while few are
+#   "reheat"           geometric, raising the temperature again whenever the
+#                      best score has not improved for stall_steps steps
+#   "adaptive-reheat"  both
+#
+# Every schedule keeps the geometric iteration budget, so they can be
+# compared on proposals per solve.
+
+
+class GeometricSchedule:
+
+    def start(self, temperature, cooling_rate, iterations):
+        self.initial = temperature
+        self.temperature = temperature
+        self.cooling_rate = cooling_rate
+        self.iterations = iterations
+        self.reheats = 0
+        return self._current()
+
+    def _current(self):
+        if self.temperature <= 0.0 or self.iterations <= 0:
+            return None
+        return self.temperature, self.iterations
+
+    def cool(self, acceptance_ratio):
+        self.temperature *= self.cooling_rate
+
+    def next_step(self, proposals, acceptances, best_score):
+        self.cool(acceptances / proposals if proposals else 0.0)
+        self.iterations -= 1
+        return self._current()
+
+
+class AdaptiveSchedule(GeometricSchedule):
+    # Scales each cooling step by how the acceptance ratio compares with
+    # target_acceptance: at twice the target the temperature drops by
+    # cooling_rate ** 2, at half of it by cooling_rate ** 0.5.
+
+    def __init__(self, target_acceptance=0.3, max_exponent=4.0):
+        self.target_acceptance = target_acceptance
+        self.max_exponent = max_exponent
+
+    def cool(self, acceptance_ratio):
+        exponent = acceptance_ratio / self.target_acceptance
+        exponent = min(self.max_exponent, max(1.0 / self.max_exponent, exponent))
+        self.temperature *= self.cooling_rate ** exponent
+
+
+class ReheatingSchedule:
+    # Wraps another schedule and, once the best score has not improved for
+    # stall_steps steps, raises its temperature back to reheat times the
+    # starting temperature.
+
+    def __init__(self, schedule=None, stall_steps=8, reheat=0.5):
+        self.schedule = schedule if schedule is not None else GeometricSchedule()
+        self.stall_steps = stall_steps
+        self.reheat = reheat
+
+    def start(self, temperature, cooling_rate, iterations):
+        self.best_score = None
+        self.stalled = 0
+        self.reheats = 0
+        return self.schedule.start(temperature, cooling_rate, iterations)
+
+    def next_step(self, proposals, acceptances, best_score):
+        if self.best_score is None or best_score < self.best_score:
+            self.best_score = best_score
+            self.stalled = 0
+        else:
+            self.stalled += 1
+        if self.stalled >= self.stall_steps:
+            inner = self.schedule
+            inner.temperature = max(inner.temperature, inner.initial * self.reheat)
+            self.stalled = 0
+            self.reheats += 1
+        return self.schedule.next_step(proposals, acceptances, best_score)
+
+
+SCHEDULES = {
+    "geometric": GeometricSchedule,
+    "adaptive": AdaptiveSchedule,
+    "reheat": ReheatingSchedule,
+    "adaptive-reheat": lambda: ReheatingSchedule(AdaptiveSchedule()),
+}
+
+
+def make_schedule(schedule=None):
+    # Turns a schedule name (or None for "geometric") into a fresh schedule;
+    # schedule objects are returned as they are.
+    if schedule is None:
+        schedule = "geometric"
+    if isinstance(schedule, str):
+        if schedule not in SCHEDULES:
+            raise ValueError("Unknown schedule: %r" % (schedule,))
+        return SCHEDULES[schedule]()
+    return schedule
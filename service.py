@@ -0,0 +1,508 @@
+# Local HTTP/JSON solver service.
+#
+# An asyncio server that accepts puzzles in the (cells, target_sum)
+# constraint format and solves them on a process pool. Requests that arrive
+# while every worker is busy queue up and are handed to the next free worker
+# together, up to batch_size at a time, so a busy service pays one
+# inter-process round trip per batch rather than per puzzle. Only the
+# standard library and the solver core are imported (no pygame, no numpy
+# unless the batch engine is asked for), so it starts quickly.
+#
+#   POST /solve    {"constraints": [...], "size": 9, "box": [3, 3], "engine": "exact",
+#                   "deadline": 2.0, "seed": 1, "id": "abc"}   (or just the constraint list)
+#                  -> {"id", "solved", "solution", "stats", "latency"}; 504 past the deadline
+#   POST /cancel   {"id": "abc"} cancels that request, whether it is still
+#                  queued or already handed to a worker
+#   GET  /metrics  queue depth, in-flight batches, counters, latency histogram
+#                  and percentiles, batch sizes and throughput
+#   GET  /health
+#
+#   python service.py serve --port 8765 --workers 4 --cache solutions.sqlite
+#   python service.py load bench_corpus.jsonl --requests 400 --concurrency 32 --workers 1 2 4
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_cli import cache_for, puzzle_from_data, read_lines
+from percentiles import percentile
+from solver import ENGINES, SolveCancelled, solve
+
+# Upper bounds, in seconds, of the latency histogram buckets (the last bucket is unbounded)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Throughput is reported over this many most recent seconds
+THROUGHPUT_WINDOW = 10.0
+# Latencies kept for the percentiles
+RECENT_LATENCIES = 2000
+# Seconds between a worker's checks of the shared cancelled set during a solve
+CANCEL_POLL = 0.01
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 499: "Cancelled", 500: "Internal Server Error",
+           504: "Gateway Timeout"}
+
+
+class CancelFlag:
+    # threading.Event-like view, for solve(cancel=...), of whether a request's
+    # token is in the service's shared cancelled set (a Manager dict). The
+    # set lives in another process, so it is looked up at most every
+    # CANCEL_POLL seconds.
+
+    def __init__(self, cancelled, token):
+        self.cancelled = cancelled
+        self.token = token
+        self._set = token in cancelled
+        self._checked = time.monotonic()
+
+    def is_set(self):
+        if not self._set:
+            now = time.monotonic()
+            if now - self._checked >= CANCEL_POLL:
+                self._checked = now
+                try:
+                    self._set = self.token in self.cancelled
+                except (OSError, EOFError):
+                    # The service has shut its manager down
+                    self._set = True
+        return self._set
+
+
+def solve_batch(items, cache_path=None, cancelled=None):
+    # Runs in a worker process: solves every (constraints, size, box, engine,
+    # seed, deadline, token) item in turn and returns one record per item.
+    # deadline is a time.time() value or None; it caps the solve's
+    # time_limit. cancelled, the service's shared set of cancelled tokens,
+    # skips items cancelled before they start and stops ones cancelled while
+    # solving.
+    records = []
+    for constraints, size, box, engine, seed, deadline, token in items:
+        time_limit = None
+        if deadline is not None:
+            time_limit = deadline - time.time()
+            if time_limit <= 0:
+                records.append({"error": "deadline exceeded", "status": 504})
+                continue
+        cancel = None if cancelled is None else CancelFlag(cancelled, token)
+        if cancel is not None and cancel.is_set():
+            records.append({"error": "cancelled", "status": 499})
+            continue
+        try:
+            result = solve(constraints, engine=engine, seed=seed, size=size, box=box,
+                           time_limit=time_limit, cache=cache_for(cache_path), cancel=cancel)
+        except SolveCancelled:
+            records.append({"error": "cancelled", "status": 499})
+            continue
+        except (ValueError, KeyError, TypeError, IndexError) as error:
+            records.append({"error": str(error), "status": 400})
+            continue
+        records.append({"solved": result.solved, "solution": result.solution if result.solved else None,
+                        "stats": result.stats})
+    return records
+
+
+class Metrics:
+    # Counters, a latency histogram and throughput for the service.
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = Counter()
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latencies = deque(maxlen=RECENT_LATENCIES)
+        self.completions = deque()
+        self.batch_sizes = Counter()
+
+    def observe(self, latency):
+        now = time.monotonic()
+        self.counters["completed"] += 1
+        self.latencies.append(latency)
+        self.completions.append(now)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_buckets[index] += 1
+                break
+        else:
+            self.latency_buckets[-1] += 1
+
+    def snapshot(self, queue_depth, in_flight):
+        now = time.monotonic()
+        while self.completions and self.completions[0] < now - THROUGHPUT_WINDOW:
+            self.completions.popleft()
+        uptime = now - self.started
+        window = min(THROUGHPUT_WINDOW, uptime) or 1.0
+        bounds = ["%g" % bound for bound in LATENCY_BUCKETS] + ["+Inf"]
+        return {
+            "uptime": uptime,
+            "queue_depth": queue_depth,
+            "in_flight_batches": in_flight,
+            "counters": dict(self.counters),
+            "latency_histogram": dict(zip(bounds, self.latency_buckets)),
+            "latency": {"p50": percentile(list(self.latencies), 0.5),
+                        "p95": percentile(list(self.latencies), 0.95),
+                        "p99": percentile(list(self.latencies), 0.99)},
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "throughput": {"recent": len(self.completions) / window,
+                           "overall": self.counters["completed"] / (uptime or 1.0)},
+        }
+
+
+class Request:
+    __slots__ = ("puzzle_id", "token", "item", "deadline", "future", "received")
+
+    def __init__(self, puzzle_id, token, item, deadline, future):
+        self.puzzle_id = puzzle_id
+        self.token = token
+        self.item = item
+        self.deadline = deadline
+        self.future = future
+        self.received = time.monotonic()
+
+
+class SolverService:
+    # The queue, batcher, worker pool and HTTP front end.
+
+    def __init__(self, workers=None, batch_size=8, batch_wait=0.002, engine="exact",
+                 default_deadline=None, cache_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.engine = engine
+        self.default_deadline = default_deadline
+        self.cache_path = cache_path
+        self.metrics = Metrics()
+        self.queue = None
+        self.pool = None
+        self.server = None
+        self.in_flight = 0
+        self._slots = None
+        self._tasks = set()
+        self._batcher = None
+        self._pending = set()
+        self._connections = {}
+        # Tokens number requests (ids are optional and need not be unique);
+        # those of batched requests that were cancelled or timed out go into
+        # a Manager dict the workers poll
+        self._tokens = itertools.count()
+        self._manager = None
+        self._cancelled = None
+        self._batched = set()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._manager = multiprocessing.Manager()
+        self._cancelled = self._manager.dict()
+        self._batcher = asyncio.create_task(self._run_batcher())
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        # Stops accepting, answers waiting requests as cancelled, lets the
+        # connections finish and shuts the pool down.
+        self.server.close()
+        self._batcher.cancel()
+        for request in list(self._pending):
+            self._withdraw(request)
+        for writer in self._connections.values():
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=1.0)
+        for task in list(self._tasks):
+            task.cancel()
+        await self.server.wait_closed()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
+
+    # Batching
+
+    async def _run_batcher(self):
+        # Waits for a free worker, then takes everything queued (up to
+        # batch_size) as one batch. While all workers are busy requests pile
+        # up, so batches grow with load.
+        while True:
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            if self.batch_wait and self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.batch_wait)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        self.in_flight += 1
+        self.metrics.counters["batches"] += 1
+        self.metrics.batch_sizes[len(batch)] += 1
+        loop = asyncio.get_running_loop()
+        self._batched.update(batch)
+        try:
+            records = await loop.run_in_executor(self.pool, solve_batch,
+                                                 [request.item for request in batch], self.cache_path,
+                                                 self._cancelled)
+        except Exception as error:
+            records = [{"error": "worker failed: %s" % error, "status": 500}] * len(batch)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            self._batched.difference_update(batch)
+            for request in batch:
+                if request.future.cancelled():
+                    self._cancelled.pop(request.token, None)
+        for request, record in zip(batch, records):
+            if not request.future.done():
+                request.future.set_result(record)
+
+    # Requests
+
+    async def submit(self, data):
+        # Queues one decoded /solve body and waits for its result; returns
+        # (status, payload).
+        try:
+            puzzle_id, constraints, size, box = puzzle_from_data(data)
+            options = data if isinstance(data, dict) else {}
+            engine = options.get("engine", self.engine)
+            if engine not in ENGINES:
+                raise ValueError("Unknown engine: %r" % (engine,))
+            deadline = options.get("deadline", self.default_deadline)
+            deadline = None if deadline is None else float(deadline)
+        except (ValueError, KeyError, TypeError) as error:
+            self.metrics.counters["rejected"] += 1
+            return 400, {"error": str(error)}
+
+        self.metrics.counters["received"] += 1
+        expires = None if deadline is None else time.time() + deadline
+        token = next(self._tokens)
+        request = Request(puzzle_id, token, (constraints, size, box, engine, options.get("seed"), expires, token),
+                          expires, asyncio.get_running_loop().create_future())
+        self.queue.put_nowait(request)
+        self._pending.add(request)
+        request.future.add_done_callback(lambda _: self._pending.discard(request))
+        try:
+            record = await asyncio.wait_for(asyncio.shield(request.future), deadline)
+        except asyncio.TimeoutError:
+            self._withdraw(request)
+            self.metrics.counters["timed_out"] += 1
+            return 504, {"id": puzzle_id, "error": "deadline exceeded"}
+        except asyncio.CancelledError:
+            if request.future.cancelled():
+                self.metrics.counters["cancelled"] += 1
+                return 499, {"id": puzzle_id, "error": "cancelled"}
+            self._withdraw(request)
+            raise
+
+        latency = time.monotonic() - request.received
+        if "error" in record:
+            self.metrics.counters["failed"] += 1
+            return record.get("status", 500), {"id": puzzle_id, "error": record["error"]}
+        self.metrics.observe(latency)
+        if record["solved"]:
+            self.metrics.counters["solved"] += 1
+        return 200, dict(record, id=puzzle_id, latency=latency)
+
+    def _withdraw(self, request):
+        # Answers the request as cancelled; a queued one is then skipped by
+        # the batcher and a batched one is stopped by its worker.
+        request.future.cancel()
+        if request in self._batched:
+            self._cancelled[request.token] = True
+
+    def cancel(self, puzzle_id):
+        # Cancels every unfinished request with this id; returns how many.
+        cancelled = 0
+        for request in list(self._pending):
+            if request.puzzle_id == puzzle_id and not request.future.done():
+                self._withdraw(request)
+                cancelled += 1
+        return cancelled
+
+    # HTTP
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics.snapshot(self.queue.qsize(), self.in_flight)
+        if method == "POST" and path in ("/solve", "/cancel"):
+            try:
+                data = json.loads(body or b"null")
+            except ValueError as error:
+                return 400, {"error": "invalid JSON: %s" % error}
+            if path == "/cancel":
+                if not isinstance(data, dict) or "id" not in data:
+                    return 400, {"error": "cancel needs an id"}
+                return 200, {"cancelled": self.cancel(data["id"])}
+            status, payload = await self.submit(data)
+            return status, payload
+        return 404, {"error": "no route for %s %s" % (method, path)}
+
+    async def _handle_connection(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: one JSON request, one JSON reply.
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._route(method, path, body)
+                data = json.dumps(payload).encode()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\nConnection: %s\r\n\r\n"
+                             % (status, REASONS.get(status, "").encode(), len(data),
+                                b"keep-alive" if keep_alive else b"close"))
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+
+async def _post(reader, writer, path, payload):
+    # One keep-alive POST from the load client; returns (status, body).
+    data = json.dumps(payload).encode()
+    writer.write(b"POST %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 b"Content-Length: %d\r\n\r\n" % (path.encode(), len(data)))
+    writer.write(data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load_test(host, port, puzzles, requests=200, concurrency=16, deadline=None):
+    # Sends 'requests' solves from 'concurrency' keep-alive connections,
+    # cycling through puzzles (decoded /solve bodies). Returns a summary.
+    latencies = []
+    statuses = Counter()
+    counter = iter(range(requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for number in counter:
+                body = dict(puzzles[number % len(puzzles)])
+                if deadline is not None:
+                    body["deadline"] = deadline
+                start = time.perf_counter()
+                status, _ = await _post(reader, writer, "/solve", body)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests": requests, "elapsed": elapsed, "throughput": requests / elapsed,
+            "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+            "statuses": dict(statuses)}
+
+
+def _load_puzzles(path):
+    with open(path) as stream:
+        return [json.loads(line) for _, line in read_lines(stream)]
+
+
+async def _serve(args):
+    service = SolverService(args.workers, args.batch_size, args.batch_wait, args.engine,
+                            args.deadline, args.cache)
+    port = await service.start(args.host, args.port)
+    print("Serving on http://%s:%d with %d workers" % (args.host, port, service.workers), file=sys.stderr)
+    try:
+        await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+async def _load(args):
+    puzzles = _load_puzzles(args.puzzles)
+    for body in puzzles:
+        body.setdefault("engine", args.engine)
+    if args.port:
+        summary = await load_test(args.host, args.port, puzzles, args.requests, args.concurrency,
+                                  args.deadline)
+        print(json.dumps(summary))
+        return
+    # No server given: start one per worker count and compare
+    print("%8s %10s %9s %9s  %s" % ("workers", "req/s", "p50 s", "p95 s", "statuses"))
+    for workers in args.workers:
+        service = SolverService(workers, args.batch_size, args.batch_wait, args.engine)
+        port = await service.start(args.host, 0)
+        try:
+            await load_test(args.host, port, puzzles, workers * 2, workers)  # warm the pool up
+            summary = await load_test(args.host, port, puzzles, args.requests, args.concurrency,
+                                      args.deadline)
+        finally:
+            await service.close()
+        print("%8d %10.1f %9.4f %9.4f  %s" % (workers, summary["throughput"], summary["p50"],
+                                              summary["p95"], summary["statuses"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Killer Sudoku solver service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the HTTP service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, default=None, help="solver processes (default: CPU count)")
+    serve.add_argument("--cache", metavar="PATH", help="sqlite solution cache")
+    serve.add_argument("--deadline", type=float, default=None, help="default seconds per request")
+
+    load = commands.add_parser("load", help="load-test a service, or fresh ones per worker count")
+    load.add_argument("puzzles", help="JSON-lines puzzle file")
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=None, help="existing service to load")
+    load.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    load.add_argument("--requests", type=int, default=200)
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--deadline", type=float, default=None)
+
+    for command in (serve, load):
+        command.add_argument("--engine", choices=ENGINES, default="exact")
+        command.add_argument("--batch-size", type=int, default=8)
+        command.add_argument("--batch-wait", type=float, default=0.002, help="seconds to let a batch fill")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_serve(args) if args.command == "serve" else _load(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
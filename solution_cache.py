@@ -0,0 +1,287 @@
+# Persistent solution cache.
+#
+# Puzzles are keyed by a canonical form that is the same for every puzzle
+# reachable from it by a grid symmetry: permuting bands, stacks, and rows or
+# columns within them, transposing (square boxes only; with the reversals
+# this covers rotations and reflections), complementing digits (d -> N + 1 - d,
+# which maps a cage sum S of k cells to k * (N + 1) - S) and reordering
+# cages. The cache stores the solution of the canonical puzzle; a hit maps it
+# back through the caller's symmetry and checks it against the caller's
+# constraints, so it never returns a wrong board.
+#
+# Rows and columns are ordered by signatures that do not depend on the
+# symmetry, and only lines with equal signatures are tried in every order
+# (up to MAX_ORDERINGS combinations), so canonicalizing is cheap even for 9x9.
+#
+#   cache = SolutionCache("solutions.sqlite")
+#   result = solve(constraints, size=9, cache=cache)
+
+import hashlib
+import itertools
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from grid import resolve_box
+
+# Most row-order x column-order combinations tried per variant before the
+# tie-breaking falls back to the first order (a possible miss, never a wrong hit)
+MAX_ORDERINGS = 512
+
+
+def _freeze(constraints):
+    return tuple((tuple(tuple(cell) for cell in cells), target_sum) for cells, target_sum in constraints)
+
+
+def _line_orders(signatures, block, count):
+    # Every order of lines grouping them into blocks of 'block' lines that
+    # sorts blocks, and lines within blocks, by signature; lines or blocks
+    # with equal signatures are tried in every order. Returns at most
+    # 'count' + 1 orders (stopping early tells the caller there are more).
+    blocks = [tuple(sorted(range(start, start + block), key=lambda line: signatures[line]))
+              for start in range(0, len(signatures), block)]
+    blocks.sort(key=lambda lines: [signatures[line] for line in lines])
+
+    def ties(items, key):
+        return [list(run) for _, run in itertools.groupby(items, key)]
+
+    def arrangements(lines):
+        runs = ties(lines, lambda line: signatures[line])
+        for choice in itertools.product(*(itertools.permutations(run) for run in runs)):
+            yield [line for run in choice for line in run]
+
+    def block_run_orders(run):
+        for order in itertools.permutations(run):
+            for choice in itertools.product(*(list(arrangements(lines)) for lines in order)):
+                yield [line for lines in choice for line in lines]
+
+    runs = ties(blocks, lambda lines: [signatures[line] for line in lines])
+    orders = []
+    for choice in itertools.product(*(list(itertools.islice(block_run_orders(run), count + 1))
+                                      for run in runs)):
+        orders.append([line for lines in choice for line in lines])
+        if len(orders) > count:
+            break
+    return orders
+
+
+def _encode(cage_of, sums, size, rows, cols):
+    # Cage of every cell in the given row/column order, with cages numbered
+    # by first appearance, followed by the cage sums in that numbering.
+    numbers = {}
+    cells = []
+    for row in rows:
+        base = row * size
+        for col in cols:
+            cage = cage_of[base + col]
+            if cage < 0:
+                cells.append(0)
+                continue
+            number = numbers.get(cage)
+            if number is None:
+                number = numbers[cage] = len(numbers) + 1
+            cells.append(number)
+    ordered_sums = [0] * len(numbers)
+    for cage, number in numbers.items():
+        ordered_sums[number - 1] = sums[cage]
+    return tuple(cells), tuple(ordered_sums)
+
+
+def _canonical_variant(cage_of, sums, size, box_rows, box_cols):
+    # Smallest encoding over the row/column orders of one variant, with the
+    # row and column order that gives it.
+    cage_size = [0] * len(sums)
+    rows_of = [[0] * size for _ in sums]
+    cols_of = [[0] * size for _ in sums]
+    for index, cage in enumerate(cage_of):
+        if cage >= 0:
+            cage_size[cage] += 1
+            rows_of[cage][index // size] += 1
+            cols_of[cage][index % size] += 1
+
+    def label(index):
+        cage = cage_of[index]
+        if cage < 0:
+            return (0, 0, 0, 0)
+        return (cage_size[cage], sums[cage], rows_of[cage][index // size], cols_of[cage][index % size])
+
+    labels = [label(index) for index in range(size * size)]
+    # One refinement round: each cell also carries its row's and column's
+    # signature. Signatures are the sorted labels themselves, not hash() of
+    # them, since they decide the stored key and tuple hashes differ between
+    # Python builds.
+    row_sig = [tuple(sorted(labels[row * size:(row + 1) * size])) for row in range(size)]
+    col_sig = [tuple(sorted(labels[col::size])) for col in range(size)]
+    refined = [(labels[index], row_sig[index // size], col_sig[index % size]) for index in range(size * size)]
+    row_sig = [tuple(sorted(refined[row * size:(row + 1) * size])) for row in range(size)]
+    col_sig = [tuple(sorted(refined[col::size])) for col in range(size)]
+
+    row_orders = _line_orders(row_sig, box_rows, MAX_ORDERINGS)
+    col_orders = _line_orders(col_sig, box_cols, MAX_ORDERINGS)
+    if len(row_orders) * len(col_orders) > MAX_ORDERINGS:
+        row_orders, col_orders = row_orders[:1], col_orders[:1]
+
+    best = None
+    for rows in row_orders:
+        for cols in col_orders:
+            encoding = _encode(cage_of, sums, size, rows, cols)
+            if best is None or encoding < best[0]:
+                best = (encoding, rows, cols)
+    return best
+
+
+@lru_cache(maxsize=256)
+def _canonical(frozen, size, box):
+    box_rows, box_cols = box
+    cage_of = [-1] * (size * size)
+    sums = []
+    for cage, (cells, target_sum) in enumerate(frozen):
+        if not isinstance(target_sum, int):
+            raise ValueError("every cage needs an integer sum")
+        for row, col in cells:
+            cage_of[row * size + col] = cage
+        sums.append(target_sum)
+    sizes = [len(cells) for cells, _ in frozen]
+    complemented = [count * (size + 1) - target_sum for count, target_sum in zip(sizes, sums)]
+    transposed = [cage_of[(index % size) * size + index // size] for index in range(size * size)]
+
+    best = None
+    for transpose in ((False, True) if box_rows == box_cols else (False,)):
+        for complement in (False, True):
+            encoding, rows, cols = _canonical_variant(transposed if transpose else cage_of,
+                                                      complemented if complement else sums,
+                                                      size, box_rows, box_cols)
+            if best is None or encoding < best[0]:
+                best = (encoding, (transpose, complement, tuple(rows), tuple(cols)))
+    encoding, transform = best
+    text = "%d:%dx%d:%s" % (size, box_rows, box_cols, json.dumps(encoding, separators=(",", ":")))
+    return hashlib.sha256(text.encode()).hexdigest(), transform
+
+
+def canonical_form(constraints, size, box=None):
+    # Returns (key, transform): the key is shared by every symmetric copy of
+    # the puzzle, and transform says how this copy maps onto the canonical one.
+    return _canonical(_freeze(constraints), size, resolve_box(size, box))
+
+
+def _source_cell(transform, row, col):
+    # The cell of the caller's grid that lands on canonical cell (row, col).
+    transpose, _, rows, cols = transform
+    row, col = rows[row], cols[col]
+    return (col, row) if transpose else (row, col)
+
+
+def to_canonical(solution, transform):
+    size = len(solution)
+    complement = transform[1]
+    canonical = [[0] * size for _ in range(size)]
+    for row in range(size):
+        for col in range(size):
+            source_row, source_col = _source_cell(transform, row, col)
+            value = solution[source_row][source_col]
+            canonical[row][col] = size + 1 - value if complement else value
+    return canonical
+
+
+def from_canonical(canonical, transform):
+    size = len(canonical)
+    complement = transform[1]
+    solution = [[0] * size for _ in range(size)]
+    for row in range(size):
+        for col in range(size):
+            target_row, target_col = _source_cell(transform, row, col)
+            value = canonical[row][col]
+            solution[target_row][target_col] = size + 1 - value if complement else value
+    return solution
+
+
+def is_solution(board, constraints, box):
+    # Full check of a board against the Sudoku and cage rules.
+    size = len(board)
+    box_rows, box_cols = box
+    digits = set(range(1, size + 1))
+    lines = [set(row) for row in board] + [set(column) for column in zip(*board)]
+    lines += [{board[r][c] for r in range(top, top + box_rows) for c in range(left, left + box_cols)}
+              for top in range(0, size, box_rows) for left in range(0, size, box_cols)]
+    if any(line != digits for line in lines):
+        return False
+    for cells, target_sum in constraints:
+        values = [board[row][col] for row, col in cells]
+        if len(set(values)) != len(values) or sum(values) != target_sum:
+            return False
+    return True
+
+
+class SolutionCache:
+    # Two tiers: an in-memory LRU of 'capacity' canonical solutions in front
+    # of an optional sqlite file at 'path'. Safe to share between threads.
+
+    def __init__(self, path=None, capacity=1024):
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, solution TEXT NOT NULL)")
+            self._db.commit()
+
+    def _remember(self, key, canonical):
+        self.memory[key] = canonical
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def get(self, constraints, size, box=None):
+        # The cached solution of this puzzle, mapped to its orientation, or None.
+        box = resolve_box(size, box)
+        try:
+            key, transform = canonical_form(constraints, size, box)
+        except ValueError:
+            return None
+        with self._lock:
+            canonical = self.memory.get(key)
+            if canonical is not None:
+                self.memory.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT solution FROM solutions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    canonical = json.loads(row[0])
+                    self._remember(key, canonical)
+            if canonical is not None:
+                solution = from_canonical(canonical, transform)
+                if is_solution(solution, constraints, box):
+                    self.hits += 1
+                    return solution
+            self.misses += 1
+            return None
+
+    def put(self, constraints, size, box, solution):
+        # Stores a verified solution; returns False if it was not one.
+        box = resolve_box(size, box)
+        if not is_solution(solution, constraints, box):
+            return False
+        key, transform = canonical_form(constraints, size, box)
+        canonical = to_canonical(solution, transform)
+        with self._lock:
+            self._remember(key, canonical)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO solutions (key, solution) VALUES (?, ?)",
+                                 (key, json.dumps(canonical)))
+                self._db.commit()
+        return True
+
+    def __len__(self):
+        if self._db is not None:
+            with self._lock:
+                return self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        return len(self.memory)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,485 @@
+# Mark Toni Ramsol Tagalogon
+#
+# Headless Killer Sudoku solver core. Nothing in here imports pygame, so it
+# can be used from batch jobs and services; the GUI in ai_act2.py is just one
+# consumer of solve().
+
+import math
+import random
+import time
+from collections import deque, namedtuple
+
+from board import Board, box_cell_table
+from exact_solver import solve_exact
+from grid import box_origins, resolve_box
+from puzzle import Puzzle
+from schedules import make_schedule
+
+# Default board size; boxes default to grid.box_shape(size)
+GRID_SIZE = 4
+
+# Annealing config
+a_temperature = 1.5
+a_cooling_rate = 0.95
+a_iterations = 100
+
+# Engine used when solve() is not told otherwise; "batch" needs numpy
+ENGINES = ("annealing", "min-conflicts", "exact", "dlx", "batch", "portfolio")
+a_engine = "annealing"
+
+SolveResult = namedtuple("SolveResult", ["solution", "solved", "stats"])
+
+
+class SolveCancelled(Exception):
+    # Raised from an on_step callback to abandon a solve.
+    pass
+
+
+def constraints_from_groups(all_selected_groups):
+    # Converts GUI groups ([cell, cell, ..., sum]) into (cells, target_sum) constraints.
+    constraints = []
+    for group in all_selected_groups:
+        coordinates = group[:-1]
+        value = group[-1]
+        constraints.append((coordinates, value))
+    return constraints
+
+
+def generate_board(size=GRID_SIZE, box=None, rng=random):
+    # Generates a random initial board for the Sudoku puzzle: every box holds
+    # each digit once, rows and columns are left to the solver.
+    box_rows, box_cols = resolve_box(size, box)
+    board = [[0 for _ in range(size)] for _ in range(size)]
+
+    for qi, qj in box_origins(size, (box_rows, box_cols)):
+        values = rng.sample(range(1, size + 1), size)
+        for i in range(box_rows):
+            for j in range(box_cols):
+                board[qi + i][qj + j] = values[i * box_cols + j]
+
+    return board
+
+
+def is_valid(board, row, col, num, constraints, box=None):
+    # Checks if placing 'num' at (row, col) violates Sudoku and Killer Sudoku rules.
+    # With a compiled puzzle.Puzzle as constraints, peers and the cell's cage
+    # are looked up instead of scanned.
+    if isinstance(constraints, Puzzle):
+        index = row * constraints.size + col
+        for r, c in constraints.peers[index]:
+            if board[r][c] == num:
+                return False
+        cage = constraints.cage_of[index]
+        if cage >= 0:
+            region_sum = 0
+            for r, c in constraints.cage_cells[cage]:
+                if board[r][c] == num:
+                    return False
+                region_sum += board[r][c]
+            if region_sum + num > constraints.cage_sums[cage]:
+                return False
+        return True
+
+    size = len(board)
+    box_rows, box_cols = resolve_box(size, box)
+
+    for c in range(size):
+        if board[row][c] == num and c != col:
+            return False
+    for r in range(size):
+        if board[r][col] == num and r != row:
+            return False
+
+    start_row = (row // box_rows) * box_rows
+    start_col = (col // box_cols) * box_cols
+    for i in range(start_row, start_row + box_rows):
+        for j in range(start_col, start_col + box_cols):
+            if board[i][j] == num and (i, j) != (row, col):
+                return False
+
+    region_sum = 0
+    for cells, target_sum in constraints:
+        if (row, col) in cells:
+            for r, c in cells:
+                if board[r][c] == num:
+                    return False
+                region_sum += board[r][c]
+            if region_sum + num > target_sum:
+                return False
+            break
+    return True
+
+
+def fitness(board, constraints):
+    # Calculates the fitness score of the current board: one point for every
+    # out-of-range or repeated value in each row and each column, plus one
+    # point for every cage whose sum is off.
+    size = len(board)
+    digits = range(1, size + 1)
+    score = 0
+    for i in range(size):
+        row_values = set()
+        col_values = set()
+        for j in range(size):
+            row_value = board[i][j]
+            col_value = board[j][i]
+            if row_value not in digits or row_value in row_values:
+                score += 1
+            if col_value not in digits or col_value in col_values:
+                score += 1
+            row_values.add(row_value)
+            col_values.add(col_value)
+    for cells, target_sum in constraints:
+        cell_sum = sum(board[row][col] for row, col in cells)
+        if cell_sum != target_sum:
+            score += 1
+    return score
+
+
+class SwapScorer:
+    # Scores a board.Board incrementally: the board keeps per-row/per-column
+    # digit counters and the scorer keeps per-cage sums, so the fitness change
+    # of a two-cell swap is computed in O(1), touching only the two rows, two
+    # columns and two cages involved. Cells are flat indices (row * size + col).
+    # The score matches fitness() for boards holding digits 1..N.
+
+    def __init__(self, board, constraints):
+        if not isinstance(board, Board):
+            board = Board.from_rows(board)
+        size = board.size
+        self.board = board
+        self.stride = size + 1
+        self.cage_of = [-1] * (size * size)
+        self.cage_sums = []
+        self.cage_targets = []
+        cells = board.cells
+        for cage, (cage_cells, target_sum) in enumerate(constraints):
+            cage_sum = 0
+            for row, col in cage_cells:
+                index = row * size + col
+                self.cage_of[index] = cage
+                cage_sum += cells[index]
+            self.cage_sums.append(cage_sum)
+            self.cage_targets.append(target_sum)
+
+        score = sum(count - 1 for count in board.row_counts if count > 1)
+        score += sum(count - 1 for count in board.col_counts if count > 1)
+        for cage_sum, target_sum in zip(self.cage_sums, self.cage_targets):
+            if cage_sum != target_sum:
+                score += 1
+        self.score = score
+
+    def delta(self, index1, index2):
+        # Returns the score change swapping the two cells would cause.
+        board = self.board
+        cells = board.cells
+        a = cells[index1]
+        b = cells[index2]
+        if a == b:
+            return 0
+
+        delta = 0
+        stride = self.stride
+        row1 = board.row_of[index1] * stride
+        row2 = board.row_of[index2] * stride
+        if row1 != row2:
+            counts = board.row_counts
+            delta += (counts[row1 + b] > 0) - (counts[row1 + a] > 1)
+            delta += (counts[row2 + a] > 0) - (counts[row2 + b] > 1)
+        col1 = board.col_of[index1] * stride
+        col2 = board.col_of[index2] * stride
+        if col1 != col2:
+            counts = board.col_counts
+            delta += (counts[col1 + b] > 0) - (counts[col1 + a] > 1)
+            delta += (counts[col2 + a] > 0) - (counts[col2 + b] > 1)
+
+        cage1 = self.cage_of[index1]
+        cage2 = self.cage_of[index2]
+        if cage1 != cage2:
+            if cage1 >= 0:
+                old_sum = self.cage_sums[cage1]
+                target_sum = self.cage_targets[cage1]
+                delta += (old_sum + b - a != target_sum) - (old_sum != target_sum)
+            if cage2 >= 0:
+                old_sum = self.cage_sums[cage2]
+                target_sum = self.cage_targets[cage2]
+                delta += (old_sum + a - b != target_sum) - (old_sum != target_sum)
+        return delta
+
+    def swap(self, index1, index2, delta=None):
+        # Swaps the two cells on the board and updates the cage sums and score.
+        if delta is None:
+            delta = self.delta(index1, index2)
+        cells = self.board.cells
+        a = cells[index1]
+        b = cells[index2]
+        if a == b:
+            return
+        self.board.swap(index1, index2)
+
+        cage1 = self.cage_of[index1]
+        cage2 = self.cage_of[index2]
+        if cage1 != cage2:
+            if cage1 >= 0:
+                self.cage_sums[cage1] += b - a
+            if cage2 >= 0:
+                self.cage_sums[cage2] += a - b
+        self.score += delta
+
+
+def random_swap(size=GRID_SIZE, box=None, rng=random):
+    # Picks two random cells in the same box.
+    box_rows, box_cols = resolve_box(size, box)
+    quadrant_i = rng.randrange(size // box_rows) * box_rows
+    quadrant_j = rng.randrange(size // box_cols) * box_cols
+
+    i1, j1 = quadrant_i + rng.randrange(box_rows), quadrant_j + rng.randrange(box_cols)
+    i2, j2 = quadrant_i + rng.randrange(box_rows), quadrant_j + rng.randrange(box_cols)
+
+    return (i1, j1), (i2, j2)
+
+
+def select_neighbor(board, rng=random, box=None):
+    # Selects a neighboring solution by swapping two random cells in the same box.
+    (i1, j1), (i2, j2) = random_swap(len(board), box, rng)
+    board[i1][j1], board[i2][j2] = board[i2][j2], board[i1][j1]
+
+    return board, (i1, j1), (i2, j2)
+
+
+def simulated_annealing(board, constraints, temperature, cooling_rate, iterations,
+                        on_step=None, rng=random, stats=None, box=None, instrument=None,
+                        schedule=None, tabu=0, time_limit=None):
+    # Solves the Sudoku puzzle using simulated annealing. board (rows of
+    # digits) is copied into a board.Board and left untouched; the best board
+    # seen is kept as a snapshot and returned as rows.
+    # on_step(board, score, temperature) is called after every temperature step.
+    # stats, if given, is filled with step counts and the proposal, acceptance,
+    # uphill acceptance and fitness call counters. instrument, an
+    # instrumentation.Instrumentation, adds phase timings and step events.
+    # schedule is a schedules name or schedule object (default "geometric").
+    # tabu > 0 forbids swapping a cell pair again within the next 'tabu'
+    # accepted swaps, unless the swap would beat the best score. time_limit,
+    # in seconds, is checked after every temperature step.
+    if stats is None:
+        stats = {}
+    for counter in ("proposals", "acceptances", "uphill_acceptances", "fitness_calls", "steps",
+                    "reheats", "tabu_rejections"):
+        stats.setdefault(counter, 0)
+    timed = instrument is not None and instrument.timing
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    deadline = None if time_limit is None else started + time_limit
+
+    size = len(board)
+    box = resolve_box(size, box)
+    grid = Board.from_rows(board, box)
+    scorer = SwapScorer(grid, constraints)
+    score = scorer.score
+    stats["fitness_calls"] += 1
+    if score == 0:
+        return grid.to_rows(), True
+
+    # Swaps are drawn as flat indices from the box tables with rng.random(),
+    # which is much cheaper than random_swap()'s four randrange() calls
+    boxes = box_cell_table(size, box)
+    box_count = len(boxes)
+    random_ = rng.random
+    best = grid.snapshot()
+    best_score = score
+    proposals = acceptances = uphill = tabu_rejections = 0
+    neighbor_time = scoring_time = acceptance_time = 0.0
+    schedule = make_schedule(schedule)
+    tabu_order = deque()
+    tabu_pairs = set()
+
+    def record():
+        stats["proposals"] += proposals
+        stats["acceptances"] += acceptances
+        stats["uphill_acceptances"] += uphill
+        stats["fitness_calls"] += proposals
+        stats["reheats"] += schedule.reheats
+        stats["tabu_rejections"] += tabu_rejections
+        if timed:
+            instrument.add_time("neighbor", neighbor_time)
+            instrument.add_time("scoring", scoring_time)
+            instrument.add_time("acceptance", acceptance_time)
+
+    step = schedule.start(temperature, cooling_rate, iterations)
+    while step is not None:
+        temperature, iterations = step
+        step_proposals, step_acceptances = proposals, acceptances
+        for _ in range(iterations):
+            if timed:
+                t0 = perf_counter()
+            cells = boxes[int(random_() * box_count)]
+            cell1 = cells[int(random_() * size)]
+            cell2 = cells[int(random_() * size)]
+            proposals += 1
+            if timed:
+                t1 = perf_counter()
+                neighbor_time += t1 - t0
+
+            delta_e = scorer.delta(cell1, cell2)
+            if timed:
+                t2 = perf_counter()
+                scoring_time += t2 - t1
+
+            if tabu:
+                pair = (cell1, cell2) if cell1 < cell2 else (cell2, cell1)
+            if tabu and pair in tabu_pairs and score + delta_e >= best_score:
+                tabu_rejections += 1
+            elif delta_e <= 0 or random_() < math.exp(-delta_e / temperature):
+                scorer.swap(cell1, cell2, delta_e)
+                acceptances += 1
+                if tabu and cell1 != cell2 and pair not in tabu_pairs:
+                    tabu_pairs.add(pair)
+                    tabu_order.append(pair)
+                    if len(tabu_order) > tabu:
+                        tabu_pairs.discard(tabu_order.popleft())
+                if delta_e > 0:
+                    uphill += 1
+                score = scorer.score
+                if score < best_score:
+                    best_score = score
+                    best = grid.snapshot()
+                    if score == 0:
+                        record()
+                        return grid.to_rows(), True
+            if timed:
+                acceptance_time += perf_counter() - t2
+
+        stats["steps"] += 1
+        if instrument is not None:
+            instrument.emit("step", step=stats["steps"], temperature=temperature, score=score,
+                            best_score=best_score, proposals=stats["proposals"] + proposals,
+                            acceptances=stats["acceptances"] + acceptances,
+                            uphill_acceptances=stats["uphill_acceptances"] + uphill,
+                            fitness_calls=stats["fitness_calls"] + proposals,
+                            elapsed=perf_counter() - started)
+        if on_step is not None:
+            on_step(grid.to_rows(), score, temperature)
+        if deadline is not None and perf_counter() > deadline:
+            break
+
+        step = schedule.next_step(proposals - step_proposals, acceptances - step_acceptances,
+                                  best_score)
+
+    record()
+    return Board(size, box, best).to_rows(), False
+
+
+def solve(constraints, temperature=None, cooling_rate=None, iterations=None,
+          on_step=None, seed=None, engine=None, time_limit=None, size=GRID_SIZE, box=None,
+          chains=256, workers=None, instrument=None, cancel=None, schedule=None, tabu=0,
+          cache=None):
+    # Solves a size x size puzzle given as (cells, target_sum) constraints
+    # without any GUI. box is (box_rows, box_cols), defaulting to the most
+    # square shape that tiles the grid.
+    # engine is "annealing" (stochastic, may fail), "min-conflicts" (local
+    # search on the most conflicted cells, see min_conflicts.py; may fail
+    # too), "batch" (annealing of 'chains' boards at once with numpy),
+    # "portfolio" (annealing restarts on 'workers' processes until one
+    # succeeds or time_limit passes), "exact" (backtracking, always answers
+    # unless time_limit runs out) or "dlx" (the same guarantee via exact
+    # cover with dancing links). time_limit, in seconds, bounds every engine;
+    # the annealing engines check it after each temperature step.
+    # instrument is an optional instrumentation.Instrumentation. cancel is an
+    # optional threading.Event; setting it makes solve() raise SolveCancelled.
+    # schedule (see schedules.py) applies to "annealing" and "batch"; tabu,
+    # the tabu list length, to "annealing" only. cache is an optional
+    # solution_cache.SolutionCache consulted before solving and filled after
+    # a success; a hit returns at once with stats["cache"] == "hit".
+    # Returns a SolveResult(solution, solved, stats).
+    if engine is None:
+        engine = a_engine
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine: %r" % (engine,))
+
+    box = resolve_box(size, box)
+    stats = {"engine": engine}
+    start = time.perf_counter()
+    if cancel is not None:
+        progress = on_step
+
+        def on_step(board, score, temperature):
+            if cancel.is_set():
+                raise SolveCancelled()
+            if progress is not None:
+                progress(board, score, temperature)
+
+    if cache is not None:
+        solution = cache.get(constraints, size, box)
+        stats["cache"] = "miss" if solution is None else "hit"
+        if solution is not None:
+            if on_step is not None:
+                on_step(solution, 0, 0.0)
+            stats["time"] = time.perf_counter() - start
+            if instrument is not None:
+                instrument.finish(stats)
+            return SolveResult(solution, True, stats)
+
+    if engine == "portfolio":
+        from portfolio import solve_portfolio
+
+        result = solve_portfolio(constraints, workers=workers, deadline=time_limit, seed=seed,
+                                 size=size, box=box, cancel=cancel)
+        if result.solved and on_step is not None:
+            on_step(result.solution, 0, 0.0)
+        if cache is not None:
+            result.stats["cache"] = "miss"
+            if result.solved:
+                cache.put(constraints, size, box, result.solution)
+        if instrument is not None:
+            instrument.finish(result.stats)
+        return result
+    if engine in ("exact", "dlx"):
+        if engine == "dlx":
+            from dlx_solver import solve_dlx
+
+            solution, solved = solve_dlx(constraints, size, box, time_limit=time_limit, stats=stats,
+                                         cancel=cancel)
+        else:
+            solution, solved = solve_exact(constraints, size, box, time_limit=time_limit, stats=stats,
+                                           cancel=cancel)
+        if cancel is not None and cancel.is_set():
+            raise SolveCancelled()
+        if solution is None:
+            solution = [[0] * size for _ in range(size)]
+        elif on_step is not None:
+            on_step(solution, 0, 0.0)
+    else:
+        if temperature is None:
+            temperature = a_temperature
+        if cooling_rate is None:
+            cooling_rate = a_cooling_rate
+        if iterations is None:
+            iterations = a_iterations
+
+        if engine == "min-conflicts":
+            from min_conflicts import min_conflicts
+
+            rng = random.Random(seed) if seed is not None else random
+            solution, solved = min_conflicts(generate_board(size, box, rng), constraints,
+                                             on_step=on_step, rng=rng, stats=stats, box=box,
+                                             instrument=instrument, time_limit=time_limit)
+        elif engine == "batch":
+            from batch_annealing import batch_annealing
+
+            solution, solved = batch_annealing(constraints, temperature, cooling_rate, iterations,
+                                               size, box, chains=chains, seed=seed,
+                                               on_step=on_step, stats=stats, instrument=instrument,
+                                               schedule=schedule, time_limit=time_limit)
+        else:
+            rng = random.Random(seed) if seed is not None else random
+            board = generate_board(size, box, rng)
+            solution, solved = simulated_annealing(board, constraints, temperature, cooling_rate,
+                                                   iterations, on_step=on_step, rng=rng,
+                                                   stats=stats, box=box, instrument=instrument,
+                                                   schedule=schedule, tabu=tabu, time_limit=time_limit)
+    if solved and cache is not None:
+        cache.put(constraints, size, box, solution)
+    stats["time"] = time.perf_counter() - start
+    if instrument is not None:
+        instrument.finish(stats)
+    return SolveResult([row[:] for row in solution], solved, stats)
@@ -0,0 +1,9 @@
+from background_solver import BackgroundSolve
+
+
+def test_full_queue_keeps_newest_board():
+    job = BackgroundSolve([])
+    for score in range(5):
+        job._on_step([[score]], score, 1.0)
+    assert job.latest() == ([[4]], 4, 1.0)
+    assert job.latest() is None
@@ -0,0 +1,76 @@
+import pytest
+
+from corpus_format import (HEADER, CorpusError, CorpusReader, decode_puzzle, encode_puzzle,
+                           load_puzzle, write_corpus)
+
+PUZZLES = [
+    ("4x4", [([(0, 0), (0, 1)], 3), ([(1, 0)], 4), ([(3, 2), (3, 3), (2, 3)], 7)], 4, (2, 2)),
+    (None, [([(0, 0), (1, 0), (1, 1)], 12)], 6, (2, 3)),
+    ("9x9", [([(8, 8)], 9), ([(4, 4), (4, 5)], None)], 9, (3, 3)),
+]
+
+
+def normalized(puzzle):
+    puzzle_id, constraints, size, box = puzzle
+    return puzzle_id, [(sorted(cells), target or 0) for cells, target in constraints], size, tuple(box)
+
+
+def test_encode_decode_round_trip():
+    for puzzle_id, constraints, size, box in PUZZLES:
+        data = b"xx" + encode_puzzle(constraints, size, box, puzzle_id)
+        assert normalized(decode_puzzle(data, 2)) == normalized((puzzle_id, constraints, size, box))
+
+
+def test_corpus_round_trip(tmp_path):
+    path = str(tmp_path / "puzzles.kspz")
+    assert write_corpus(path, PUZZLES) == len(PUZZLES)
+    with CorpusReader(path) as reader:
+        assert len(reader) == len(PUZZLES)
+        assert [normalized(puzzle) for puzzle in reader] == [normalized(puzzle) for puzzle in PUZZLES]
+        assert normalized(reader[-1]) == normalized(PUZZLES[-1])
+    assert normalized(load_puzzle(path, 1)) == normalized(PUZZLES[1])
+
+
+@pytest.mark.parametrize("data", [b"", b"KSPZ", b"not a corpus at all, just junk bytes"])
+def test_not_a_corpus(tmp_path, data):
+    path = tmp_path / "junk.kspz"
+    path.write_bytes(data)
+    with pytest.raises(CorpusError):
+        CorpusReader(str(path))
+
+
+def test_bad_version(tmp_path):
+    path = tmp_path / "future.kspz"
+    path.write_bytes(HEADER.pack(b"KSPZ", 99, 0, 0, HEADER.size))
+    with pytest.raises(CorpusError):
+        CorpusReader(str(path))
+
+
+@pytest.mark.parametrize("cut", [5, 8 * len(PUZZLES)])
+def test_truncated_index(tmp_path, cut):
+    path = tmp_path / "puzzles.kspz"
+    write_corpus(str(path), PUZZLES)
+    path.write_bytes(path.read_bytes()[:-cut])
+    with pytest.raises(CorpusError):
+        CorpusReader(str(path))
+
+
+def test_header_only(tmp_path):
+    path = tmp_path / "puzzles.kspz"
+    write_corpus(str(path), PUZZLES)
+    path.write_bytes(path.read_bytes()[:HEADER.size])
+    with pytest.raises(CorpusError):
+        CorpusReader(str(path))
+
+
+def test_damaged_record(tmp_path):
+    path = tmp_path / "puzzles.kspz"
+    write_corpus(str(path), PUZZLES)
+    data = bytearray(path.read_bytes())
+    # Point the last index entry past the records
+    data[-8:] = (len(data) - 2).to_bytes(8, "little")
+    path.write_bytes(bytes(data))
+    with CorpusReader(str(path)) as reader:
+        reader[0]
+        with pytest.raises(CorpusError):
+            reader[len(PUZZLES) - 1]
@@ -0,0 +1,57 @@
+import itertools
+import os
+
+import pytest
+
+from benchmark import load_corpus
+from dlx_solver import DLXSolver, count_solutions_dlx, solve_dlx
+from exact_solver import count_solutions
+from grid import resolve_box
+from solution_cache import is_solution
+
+# Above every count below, so counts are complete rather than capped
+LIMIT = 5000
+CORPUS = [puzzle for puzzle in load_corpus(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        "bench_corpus.jsonl"))
+          if puzzle[2] <= 6]
+
+
+def loosened(constraints):
+    # Only every third cage kept, so the puzzle has more than one solution.
+    return constraints[::3]
+
+
+def test_empty_4x4():
+    assert sum(1 for _ in DLXSolver([], 4).solutions()) == 288
+
+
+@pytest.mark.parametrize("puzzle", CORPUS[::4], ids=[puzzle[0] for puzzle in CORPUS[::4]])
+def test_counts_match_exact_solver(puzzle):
+    _, constraints, size, box = puzzle
+    assert count_solutions_dlx(constraints, LIMIT, size, box) == count_solutions(constraints, LIMIT, size, box)
+    constraints = loosened(constraints)
+    count = count_solutions_dlx(constraints, LIMIT, size, box)
+    assert count > 1
+    assert count == count_solutions(constraints, LIMIT, size, box)
+
+
+@pytest.mark.parametrize("puzzle", CORPUS[::4], ids=[puzzle[0] for puzzle in CORPUS[::4]])
+def test_solution_is_valid(puzzle):
+    _, constraints, size, box = puzzle
+    board, solved = solve_dlx(constraints, size, box)
+    assert solved and is_solution(board, constraints, resolve_box(size, box))
+
+
+@pytest.mark.parametrize("puzzle", CORPUS[::4], ids=[puzzle[0] for puzzle in CORPUS[::4]])
+def test_search_again_after_stopping_early(puzzle):
+    _, constraints, size, box = puzzle
+    constraints = loosened(constraints)
+    solver = DLXSolver(constraints, size, box)
+    first = sorted(map(str, itertools.islice(solver.solutions(), LIMIT)))
+    # Stop a second pass part way through; closing the generator must
+    # restore every link it covered or hid
+    partial = solver.solutions()
+    for _ in itertools.islice(partial, 2):
+        pass
+    partial.close()
+    assert sorted(map(str, itertools.islice(solver.solutions(), LIMIT))) == first
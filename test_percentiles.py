@@ -0,0 +1,25 @@
+from percentiles import percentile
+
+
+def test_empty():
+    assert percentile([], 0.5) is None
+
+
+def test_odd_length_median():
+    assert percentile([5, 1, 4, 2, 3], 0.5) == 3
+    assert percentile([7], 0.5) == 7
+
+
+def test_half_rank_rounds_up():
+    # fraction * n landing on .5 must not round half to even
+    assert percentile(range(1, 31), 0.95) == 29
+    assert percentile(range(1, 11), 0.25) == 3
+    assert percentile(range(1, 4), 0.5) == 2
+
+
+def test_bounds():
+    values = list(range(1, 21))
+    assert percentile(values, 0.0) == 1
+    assert percentile(values, 0.5) == 10
+    assert percentile(values, 0.95) == 19
+    assert percentile(values, 1.0) == 20
@@ -0,0 +1,66 @@
+import os
+import random
+
+import pytest
+
+from benchmark import load_corpus
+from grid import resolve_box
+from solution_cache import SolutionCache, canonical_form, is_solution
+from solver import solve
+
+CORPUS = load_corpus(os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_corpus.jsonl"))
+
+
+def line_permutation(size, block, rng):
+    # A random order of lines that keeps blocks (bands or stacks) together.
+    groups = [list(range(start, start + block)) for start in range(0, size, block)]
+    rng.shuffle(groups)
+    for group in groups:
+        rng.shuffle(group)
+    return [line for group in groups for line in group]
+
+
+def symmetric_copy(constraints, size, box, rng, transpose=False, complement=False):
+    # The puzzle with bands, stacks and lines within them permuted, optionally
+    # transposed and complemented, and its cages and cells reordered.
+    box_rows, box_cols = box
+    rows = line_permutation(size, box_rows, rng)
+    cols = line_permutation(size, box_cols, rng)
+    row_to, col_to = {old: new for new, old in enumerate(rows)}, {old: new for new, old in enumerate(cols)}
+    copy = []
+    for cells, target_sum in constraints:
+        moved = [(row_to[row], col_to[col]) for row, col in cells]
+        if transpose:
+            moved = [(col, row) for row, col in moved]
+        rng.shuffle(moved)
+        copy.append((moved, len(cells) * (size + 1) - target_sum if complement else target_sum))
+    rng.shuffle(copy)
+    return copy
+
+
+@pytest.mark.parametrize("puzzle", CORPUS, ids=[puzzle[0] for puzzle in CORPUS])
+def test_key_is_invariant_under_symmetry(puzzle):
+    _, constraints, size, box = puzzle
+    box = resolve_box(size, box)
+    rng = random.Random(puzzle[0])
+    key, _ = canonical_form(constraints, size, box)
+    for transpose in ((False, True) if box[0] == box[1] else (False,)):
+        for complement in (False, True):
+            copy = symmetric_copy(constraints, size, box, rng, transpose, complement)
+            assert canonical_form(copy, size, box)[0] == key
+
+
+def test_symmetric_copy_hits_cache(tmp_path):
+    _, constraints, size, box = next(puzzle for puzzle in CORPUS if puzzle[2] == 6)
+    box = resolve_box(size, box)
+    path = str(tmp_path / "solutions.sqlite")
+    cache = SolutionCache(path)
+    assert solve(constraints, engine="exact", size=size, box=box, cache=cache).solved
+    cache.close()
+
+    cache = SolutionCache(path)
+    copy = symmetric_copy(constraints, size, box, random.Random(1), complement=True)
+    solution = cache.get(copy, size, box)
+    cache.close()
+    assert solution is not None and is_solution(solution, copy, box)
+    assert cache.hits == 1
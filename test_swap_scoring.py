@@ -0,0 +1,87 @@
+# Randomized checks that the incremental swap scoring every engine relies on
+# agrees with scoring the board from scratch.
+
+import os
+import random
+
+import pytest
+
+from benchmark import load_corpus
+from board import Board, box_cell_table
+from grid import resolve_box
+from solver import SwapScorer, fitness, generate_board
+
+SWAPS = 300
+CORPUS = load_corpus(os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_corpus.jsonl"))
+
+
+def random_pairs(size, box, rng, count):
+    # Same-box and cross-box cell pairs, half of each.
+    boxes = box_cell_table(size, resolve_box(size, box))
+    for number in range(count):
+        if number % 2:
+            cells = rng.choice(boxes)
+            yield rng.choice(cells), rng.choice(cells)
+        else:
+            yield rng.randrange(size * size), rng.randrange(size * size)
+
+
+def tallies(board):
+    return (board.row_counts.tolist(), board.col_counts.tolist(), board.box_counts.tolist(),
+            board.row_masks, board.col_masks, board.box_masks)
+
+
+@pytest.mark.parametrize("puzzle", CORPUS, ids=[puzzle[0] for puzzle in CORPUS])
+def test_swap_scorer_matches_fitness(puzzle):
+    _, constraints, size, box = puzzle
+    rng = random.Random(puzzle[0])
+    # Leave a few cells out of every cage so uncaged cells are covered too
+    constraints = constraints[:-2]
+    scorer = SwapScorer(Board.from_rows(generate_board(size, box, rng), box), constraints)
+    assert scorer.score == fitness(scorer.board.to_rows(), constraints)
+    for index1, index2 in random_pairs(size, box, rng, SWAPS):
+        delta = scorer.delta(index1, index2)
+        before = scorer.score
+        scorer.swap(index1, index2, delta)
+        assert scorer.score == before + delta == fitness(scorer.board.to_rows(), constraints)
+
+
+@pytest.mark.parametrize("size, box", [(4, None), (6, (2, 3)), (9, None)])
+def test_board_swap_keeps_tallies(size, box):
+    rng = random.Random(size)
+    rows = generate_board(size, box, rng)
+    # Empty cells (digit 0) must never be counted
+    for row in rows:
+        row[rng.randrange(size)] = 0
+    board = Board.from_rows(rows, box)
+    for index1, index2 in random_pairs(size, box, rng, SWAPS * 3):
+        board.swap(index1, index2)
+        assert tallies(board) == tallies(Board(size, box, board.cells))
+
+
+@pytest.mark.parametrize("puzzle", CORPUS[::5], ids=[puzzle[0] for puzzle in CORPUS[::5]])
+def test_batch_deltas_match_rescoring(puzzle):
+    np = pytest.importorskip("numpy")
+    from batch_annealing import BatchProblem
+
+    _, constraints, size, box = puzzle
+    problem = BatchProblem(constraints[:-2], size, box)
+    rng = np.random.default_rng(0)
+    chains = 32
+    chain_ids = np.arange(chains)
+    boards = problem.random_boards(chains, rng)
+    scores = problem.scores(boards)
+    state = problem.tallies(boards)
+    box_count, box_size = problem.box_cells.shape
+    for _ in range(SWAPS // 3):
+        boxes = rng.integers(box_count, size=chains)
+        cell1 = problem.box_cells[boxes, rng.integers(box_size, size=chains)]
+        cell2 = problem.box_cells[boxes, rng.integers(box_size, size=chains)]
+        value1, value2 = boards[chain_ids, cell1], boards[chain_ids, cell2]
+        delta = problem.deltas(state, chain_ids, cell1, cell2, value1, value2)
+        accept = rng.random(chains) < 0.5
+        problem.swap(boards, state, chain_ids[accept], cell1[accept], cell2[accept],
+                     value1[accept], value2[accept])
+        scores = scores + np.where(accept, delta, 0)
+        assert (scores == problem.scores(boards)).all()
+    assert (scores == [fitness(board.reshape(size, size).tolist(), constraints[:-2]) for board in boards]).all()